@@ -3,6 +3,8 @@ import random
 import math
 import concurrent.futures
 
+import capping
+
 dt = 1
 
 # Screen dimensions
@@ -14,6 +16,7 @@ max_rank = 7            # default rank
 min_speed = 1           # set minimum movement for swarming
 max_speed = 3           # physical speed limit
 max_force = 0.5        # maximum acceleration due to al, coh, sep
+capping_strategy = "sequential"     # "sequential" first feasible in priority order, "closest" nearest candidate, "exact" projection
 perception_radius = 200
 safe_distance = 150     # distance which separation starts to be applied
 
@@ -90,129 +93,14 @@ class Boid:
         # Return next acceleration and rank
         return n_rank, n_acceleration_cap
    
-    def check_cond(self, centre, acc):              # Check if all 3 conditions are fulfiled
-        if acc.length() <= max_force and acc.distance_to(centre) <= max_speed/dt and acc.distance_to(centre) >= min_speed/dt:
-            return True
-
-    def capping(self, acc):
-        centre = -self.velocity/dt
-        # Check if original acc satisfies
-        if self.check_cond(centre, acc) == True:
-            modi = "ORIGNL"
-            return acc, modi
-        # Try scaling acc to max_force
-        if acc.length() > max_force:                                                            # Only scale if its too long
-            scaled_acc = acc / acc.length() * max_force
-            if self.check_cond(centre, scaled_acc) == True:
-                modi = "SCALED"
-                return scaled_acc, modi
-        # Try projecting acc to max_speed or min_speed
-        if acc != centre:                                                                       # Prevent division by 0
-            proj_maxv_acc = (acc - centre) / (acc - centre).length() * max_speed/dt + centre    # Projection to outer circle
-            proj_minv_acc = (acc - centre) / (acc - centre).length() * min_speed/dt + centre    # Projection to inner circle
-            if acc.distance_to(proj_maxv_acc) < acc.distance_to(proj_minv_acc):                 # Select closer projection
-                proj_acc = proj_maxv_acc
-            else:
-                proj_acc = proj_minv_acc
-            if self.check_cond(centre, proj_acc) == True:
-                modi = "PROJCT"
-                return proj_acc, modi
-        # Try getting the vertices of feasible set, return closest to acc
-        a, b = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=max_speed)
-        c, d = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=min_speed)
-        points = [a, b, c, d]
-        closest_distance = float('inf')
-        selected_acc = None
-        for point in points:
-            if point != None:
-                distance = point.distance_to(acc)
-                if distance < closest_distance:
-                    closest_distance = distance
-                    selected_acc = point
-        if selected_acc != None:
-            if self.check_cond(centre, selected_acc) == True:
-                modi = "INTSCT"
-                return selected_acc, modi
-        # BELOW SHOULD NOT BE NEEDED
-        # if 0 return 0
-        if self.check_cond(centre, acc=pygame.math.Vector2(0,0)) == True:
-            modi = "ZERO A"
-            return pygame.math.Vector2(0,0), modi
-        # if no case
-        modi = "NOCASE"
-        return pygame.math.Vector2(0,0), modi
-
-    def intersection_vertices(self, centre_a, radius_a, centre_b, radius_b):
-        d = centre_a.distance_to(centre_b)
-        if d > radius_a + radius_b:             # Circles dont intersect
-            return None, None
-        elif d < abs(radius_a - radius_b):      # One circle is contained within the other
-            return None, None
-        elif d == 0 and radius_a == radius_b:   # The circles are identical and overlap completely.")
-            return None, None
-        
-        # Point P where the line through the intersection points crosses the line between centers
-        a = (radius_a**2 - radius_b**2 + d**2) / (2 * d)
-        P = centre_a + a * (centre_b - centre_a).normalize()
-        
-        # Distance from point P to the intersection points
-        h = math.sqrt(radius_a**2 - a**2)
-        
-        # Offset vector perpendicular to the line between centers
-        offset = (centre_b - centre_a).normalize().rotate(90) * h
-        
-        # Intersection points in Vector2 format
-        intersection_1 = P + offset
-        intersection_2 = P - offset
-
-        return intersection_1, intersection_2    
-
-    def cap(self, acc):     # add min_v bound
-        found = False
-        centre = -self.velocity/dt
-        if acc.length() > 0:
-            if acc.length() > max_force:
-                scaled_acc = acc / acc.length() * max_force
-                if scaled_acc.distance_to(centre) <= max_speed/dt:
-                    steering = scaled_acc
-                    found = True
-                else:
-                    acc_from_centre = acc - centre
-                    steering = acc_from_centre / acc_from_centre.length() * max_speed/dt + centre
-                    if steering.length() <= max_force:
-                        found = True
-            else:
-                if acc.distance_to(centre) <= max_speed/dt:
-                    steering = acc
-                    found = True
-                else:
-                    acc_from_centre = acc - centre
-                    steering = acc_from_centre / acc_from_centre.length() * max_speed/dt + centre
-                    if steering.length() <= max_force:
-                        found = True
-        else:
-            steering = pygame.math.Vector2(0,0)
-            return steering
-        if found:
-            return steering
-        # find intersection 
-        return steering
- 
-    def bound_to_s_min(self, acc):                  # only do when mode == 0
-        # randomize velocity once it finishes
-        centre = -2 * self.velocity / dt
-        if acc.distance_to(centre) >= 2 * min_speed / dt**2:
-            n_acceleration = acc
-        else:
-            acc_from_centre = acc - centre
-            n_acceleration = (acc_from_centre / acc_from_centre.length() * 2 * min_speed /dt**2) + centre
-        return n_acceleration
+    def capping(self, acc):                         # acceleration within max_force, min_speed and max_speed
+        (x, y), code = capping.cap(capping_strategy, acc.x, acc.y, self.velocity.x, self.velocity.y, min_speed, max_speed, max_force, dt)
+        return pygame.math.Vector2(x, y), capping.codes[code]
 
     def update(self, n_rank, n_acceleration):
         # update attributes from the previously computed values
         self.rank = n_rank
         self.acceleration = n_acceleration
-        # self.acceleration = self.cap(n_acceleration)
         # freeze if arrived
         if self.mode == 2:      
             self.freeze()
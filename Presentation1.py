@@ -1,8 +1,9 @@
 import pygame
 import random
-import math
 import concurrent.futures
 
+import capping
+
 dt = 1
 
 # Screen dimensions
@@ -14,6 +15,7 @@ max_rank = 7            # default rank
 min_speed = 3           # set minimum movement for swarming
 max_speed = 4           # physical speed limit
 max_force = 3        # maximum acceleration due to al, coh, sep
+capping_strategy = "exact"  # "exact" projection, "closest" nearest candidate, "sequential" first feasible in priority order
 perception_radius = 200
 safe_distance = 150     # distance which separation starts to be applied
 danger_distance = 50
@@ -113,87 +115,14 @@ class Boid:
         # Return next acceleration and rank
         return n_rank, n_acceleration_cap
    
-    def check_cond(self, centre, acc):              # Check if all 3 conditions are fulfiled
-        eps = 1e-5
-        if acc.length() <= max_force + eps and acc.distance_to(centre) <= max_speed/dt + eps and acc.distance_to(centre) >= self.min_speed/dt - eps:
-            return True
-
-    def capping(self, acc):
-        capped_acc = None
-        centre = -self.velocity/dt
-        possible = []
-        # Original
-        possible.append([acc, "ORIGNL"])
-        # Scaled
-        if acc.length() > 0:
-            scaled_acc = acc / acc.length() * max_force
-            possible.append([scaled_acc, "SCALED"])
-        #Projections
-        if acc != centre:
-            a, b = self.intersection_line_circle(centre=centre, radius=self.min_speed, point=acc)
-            c, d = self.intersection_line_circle(centre=centre, radius=max_speed, point=acc)
-            points = [a, b, c, d]
-            for point in points:
-                if point != None:
-                    possible.append([point, "PROJEC"])
-        # Intersections
-        a, b = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=max_speed)
-        c, d = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=self.min_speed)
-        points = [a, b, c, d]
-        for point in points:
-            if point != None:
-                possible.append([point, "INTSCT"])
-        
-        # Check all possibilities
-        closest_distance = float('inf')
-        for possibility in possible:
-            distance = acc.distance_to(possibility[0])
-            if distance < closest_distance and self.check_cond(centre, possibility[0]) == True:
-                closest_distance = distance
-                capped_acc = possibility[0]
-                modi = possibility[1]
-
-        if capped_acc == None:
-            return pygame.math.Vector2(0,0), "ERROR"
-
-        return capped_acc, modi
-
-    def intersection_line_circle(self, centre, radius, point):
-        direction = (point-centre).normalize()
-        intersection_1 = centre + direction * radius
-        intersection_2 = centre - direction * radius
-        return intersection_1, intersection_2
-
-    def intersection_vertices(self, centre_a, radius_a, centre_b, radius_b):
-        d = centre_a.distance_to(centre_b)
-        if d > radius_a + radius_b:             # Circles dont intersect
-            return None, None
-        elif d < abs(radius_a - radius_b):      # One circle is contained within the other
-            return None, None
-        elif d == 0 and radius_a == radius_b:   # The circles are identical and overlap completely.")
-            return None, None
-        
-        # Point P where the line through the intersection points crosses the line between centers
-        a = (radius_a**2 - radius_b**2 + d**2) / (2 * d)
-        P = centre_a + a * (centre_b - centre_a).normalize()
-        
-        # Distance from point P to the intersection points
-        h = math.sqrt(radius_a**2 - a**2)
-        
-        # Offset vector perpendicular to the line between centers
-        offset = (centre_b - centre_a).normalize().rotate(90) * h
-        
-        # Intersection points in Vector2 format
-        intersection_1 = P + offset
-        intersection_2 = P - offset
-
-        return intersection_1, intersection_2    
+    def capping(self, acc):                         # nearest acceleration within max_force, min_speed and max_speed
+        (x, y), code = capping.cap(capping_strategy, acc.x, acc.y, self.velocity.x, self.velocity.y, self.min_speed, max_speed, max_force, dt)
+        return pygame.math.Vector2(x, y), capping.codes[code]
 
     def update(self, n_rank, n_acceleration):
         # update attributes from the previously computed values
         self.rank = n_rank
         self.acceleration = n_acceleration
-        # self.acceleration = self.cap(n_acceleration)
         # freeze if arrived
         if self.mode == 2:      
             self.freeze()
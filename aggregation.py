@@ -0,0 +1,144 @@
+import numpy as np
+
+import periodic
+
+# Barnes-Hut style aggregation for align and cohesion with large perception radii.
+# Every quadtree node keeps, per rank, the neighbour count and the velocity and
+# position sums of the boids below it. Nodes fully inside the perception disc
+# contribute their sums exactly; far nodes that straddle the disc edge contribute
+# their sums whole when size / distance < theta (the opening angle), and their
+# centre of mass is inside the radius. theta = 0 gives the exact sums.
+# With a period (width, height) the images of the query point across the seams
+# are visited too, and positions are reported relative to the unshifted point.
+# main.py does not use it: its boids still need the exact neighbour lists for
+# separation, ranking and the graph, so the tree walk would only add to a step.
+
+leaf_size = 8
+max_depth = 16
+
+# Columns of the per-rank sums: count, velocity x/y, position x/y
+COUNT, VX, VY, PX, PY = range(5)
+
+
+class Node:
+    def __init__(self, lo, hi, order, start, end, position, velocity, ranks, buckets, depth):
+        self.lo = lo
+        self.hi = hi
+        self.size = max(hi - lo)
+        self.start = start                  # the boids below this node are order[start:end]
+        self.end = end
+        members = order[start:end]
+        self.sums = np.zeros((buckets, 5))
+        np.add.at(self.sums, ranks[members], np.column_stack((np.ones(len(members)), velocity[members], position[members])))
+        self.centre = position[members].mean(axis=0)
+        self.children = []
+        if end - start > leaf_size and depth < max_depth:
+            mid = (lo + hi) / 2
+            quadrant = (position[members, 0] >= mid[0]) * 2 + (position[members, 1] >= mid[1])
+            order[start:end] = members[np.argsort(quadrant, kind="stable")]
+            counts = np.bincount(quadrant, minlength=4)
+            first = start
+            for q in range(4):
+                if counts[q] == 0:
+                    continue
+                right, below = q // 2, q % 2
+                c_lo = np.where((right, below), mid, lo)
+                c_hi = np.where((right, below), hi, mid)
+                self.children.append(Node(c_lo, c_hi, order, first, first + counts[q], position, velocity, ranks, buckets, depth + 1))
+                first += counts[q]
+
+
+class RankQuadtree:
+    def __init__(self, boids, buckets, theta=0.5, period=None):
+        self.boids = list(boids)
+        self.period = period
+        self.index = {boid: i for i, boid in enumerate(self.boids)}
+        self.theta = theta
+        self.buckets = buckets
+        self.position = np.array([[boid.position.x, boid.position.y] for boid in self.boids], dtype=float).reshape(-1, 2)
+        self.velocity = np.array([[boid.velocity.x, boid.velocity.y] for boid in self.boids], dtype=float).reshape(-1, 2)
+        self.ranks = np.array([min(boid.rank, buckets - 1) for boid in self.boids], dtype=int)
+        self.root = None
+        self.order = np.arange(len(self.boids))
+        if self.boids:
+            lo = self.position.min(axis=0)
+            hi = self.position.max(axis=0) + 1e-9
+            self.root = Node(lo, hi, self.order, 0, len(self.boids), self.position, self.velocity, self.ranks, buckets, 0)
+        self.slot = np.empty(len(self.boids), dtype=int)        # boid index -> place in self.order
+        self.slot[self.order] = np.arange(len(self.boids))
+
+    def rank_sums(self, boid, radius, theta=None):
+        # Per-rank (count, velocity sum, position sum) of the boids within radius, self excluded
+        theta = self.theta if theta is None else theta
+        total = np.zeros((self.buckets, 5))
+        if self.root is None:
+            return total
+        me = self.index.get(boid)
+        point = (boid.position.x, boid.position.y)
+        if self.period is not None:
+            radius = min(radius, min(self.period) / 2)
+        for sx, sy in periodic.image_shifts(point, radius, self.period):
+            image = self.gather(np.array([point[0] + sx, point[1] + sy]), me, radius, theta)
+            image[:, PX] -= sx * image[:, COUNT]                # back into the frame of the boid
+            image[:, PY] -= sy * image[:, COUNT]
+            total += image
+        return total
+
+    def gather(self, p, me, radius, theta):
+        total = np.zeros((self.buckets, 5))
+        slot = self.slot[me] if me is not None else -1
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            near = np.maximum(np.maximum(node.lo - p, p - node.hi), 0)
+            if np.hypot(near[0], near[1]) >= radius:
+                continue                                            # box entirely outside the disc
+            far = np.maximum(np.abs(node.lo - p), np.abs(node.hi - p))
+            holds_self = node.start <= slot < node.end
+            if np.hypot(far[0], far[1]) < radius:
+                total += node.sums                                  # box entirely inside: exact
+                if holds_self:
+                    total[self.ranks[me]] -= (1, *self.velocity[me], *self.position[me])
+                continue
+            if not node.children:                                   # straddling leaf: per boid
+                members = self.order[node.start:node.end]
+                members = members[members != me]
+                diff = self.position[members] - p
+                members = members[np.hypot(diff[:, 0], diff[:, 1]) < radius]
+                np.add.at(total, self.ranks[members], np.column_stack((np.ones(len(members)), self.velocity[members], self.position[members])))
+                continue
+            d = np.hypot(*(node.centre - p))
+            if not holds_self and d < radius and theta > 0 and node.size < theta * d:
+                total += node.sums                                  # far straddling cluster: aggregate
+                continue
+            stack.extend(node.children)
+        return total
+
+    def weighted_sums(self, boid, radius, weights, theta=None):
+        # weights[r]: how much a neighbour of rank r counts for this boid -> (total, velocity sum, position sum)
+        sums = self.rank_sums(boid, radius, theta)
+        weighted = (np.asarray(weights, dtype=float)[:, None] * sums).sum(axis=0)
+        return weighted[COUNT], weighted[VX:VY + 1], weighted[PX:PY + 1]
+
+
+def error_report(boids, radius, weights_of, buckets, theta, period=None):
+    # Compare the aggregated mean velocity / position against the exact sums (theta = 0)
+    tree = RankQuadtree(boids, buckets, theta, period)
+    velocity_errors, position_errors = [], []
+    for boid in boids:
+        weights = weights_of(boid)
+        total, vel, pos = tree.weighted_sums(boid, radius, weights)
+        e_total, e_vel, e_pos = tree.weighted_sums(boid, radius, weights, theta=0)
+        if e_total == 0 or total == 0:
+            continue
+        velocity_errors.append(np.hypot(*(vel / total - e_vel / e_total)))
+        position_errors.append(np.hypot(*(pos / total - e_pos / e_total)))
+    if not velocity_errors:
+        return {"boids": 0, "velocity_max": 0.0, "velocity_mean": 0.0, "position_max": 0.0, "position_mean": 0.0}
+    return {
+        "boids": len(velocity_errors),
+        "velocity_max": float(np.max(velocity_errors)),
+        "velocity_mean": float(np.mean(velocity_errors)),
+        "position_max": float(np.max(position_errors)),
+        "position_mean": float(np.mean(position_errors)),
+    }
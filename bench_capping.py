@@ -0,0 +1,37 @@
+import math
+import random
+import time
+
+import numpy as np
+
+from capping import cap, project_arrays, strategies
+
+# Microseconds per capped acceleration for each capping path, on swarm-like
+# inputs (|velocity| within the speed band). Run as a script.
+
+
+def benchmark(n=20000, seed=0, max_speed=4, max_force=3, min_speed=3):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        speed, heading = rng.uniform(0, max_speed), rng.uniform(0, 2 * math.pi)
+        rows.append((rng.uniform(-2 * max_force, 2 * max_force), rng.uniform(-2 * max_force, 2 * max_force),
+                     speed * math.cos(heading), speed * math.sin(heading), rng.uniform(0, min_speed)))
+    timings = {}
+    for name in strategies:
+        start = time.perf_counter()
+        for ax, ay, vx, vy, low in rows:
+            cap(name, ax, ay, vx, vy, low, max_speed, max_force)
+        timings[name] = (time.perf_counter() - start) / n * 1e6
+    acc = np.array([row[:2] for row in rows])
+    velocity = np.array([row[2:4] for row in rows])
+    low = np.array([row[4] for row in rows])
+    start = time.perf_counter()
+    project_arrays(acc, velocity, low, max_speed, max_force)
+    timings["arrays"] = (time.perf_counter() - start) / n * 1e6
+    return timings
+
+
+if __name__ == "__main__":
+    for name, micros in benchmark().items():
+        print(f"{name:>10}: {micros:.2f} us")
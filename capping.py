@@ -0,0 +1,255 @@
+import math
+
+import numpy as np
+
+# Kinematic capping shared by the hierarchy swarms (main.py, Presentation1.py, Hierarchy_decision.py).
+# The next acceleration a must satisfy
+#     |a| <= max_force                                  force disc
+#     min_speed / dt <= |a - c| <= max_speed / dt       speed annulus, c = -velocity / dt
+# and capping returns the feasible point closest to the requested acceleration.
+#
+# The feasible set is bounded by arcs of three circles (the force circle and the
+# two annulus circles). If the request is infeasible its nearest feasible point
+# is on one of those arcs, and along a circle the distance to the request only
+# grows moving away from the radial projection. So the answer is either the
+# radial projection onto a circle or an arc end, i.e. a vertex where two
+# circles cross. project() checks those few points and nothing else. It reports
+#     ORIGNL  the request was already feasible
+#     SCALED  radial projection onto the force circle
+#     PROJEC  radial projection onto an annulus circle
+#     INTSCT  a vertex of the feasible set
+#     EMPTY   the force disc misses the annulus, see nearest_to_annulus()
+#
+# min_speed > max_speed is treated as min_speed = max_speed.
+#
+# cap() selects between three strategies, each returning ((x, y), code):
+#     "exact"       project() above
+#     "closest"     the candidate enumerator main.py used, see closest_candidate()
+#     "sequential"  the fixed priority order of Hierarchy_decision.py, see sequential_priority()
+# The last two fall back to project() when their own candidates all fail.
+
+codes = ("ORIGNL", "SCALED", "PROJEC", "INTSCT", "EMPTY")
+ORIGNL, SCALED, PROJEC, INTSCT, EMPTY = range(5)
+
+eps = 1e-9             # feasibility tolerance, relative to the size of the constraints
+
+
+def circle_vertices(x0, y0, r0, x1, y1, r1):
+    # crossing points of two circles; [] if they miss, are nested or coincide, one point if tangent
+    dx, dy = x1 - x0, y1 - y0
+    d = math.hypot(dx, dy)
+    if d == 0 or d > r0 + r1 or d < abs(r0 - r1):
+        return []
+    a = (r0 * r0 - r1 * r1 + d * d) / (2 * d)          # along the centre line, from circle 0
+    h = math.sqrt(max(r0 * r0 - a * a, 0.0))
+    ex, ey = dx / d, dy / d
+    px, py = x0 + a * ex, y0 + a * ey
+    if h == 0:
+        return [(px, py)]
+    return [(px - h * ey, py + h * ex), (px + h * ey, py - h * ex)]
+
+
+def radial(px, py, cx, cy, radius, fx, fy):
+    # point of the circle (c, radius) nearest to p; when p is the centre every point is, take direction f
+    dx, dy = px - cx, py - cy
+    n = math.hypot(dx, dy)
+    if n == 0:
+        dx, dy, n = fx, fy, math.hypot(fx, fy)
+    return cx + dx / n * radius, cy + dy / n * radius
+
+
+def nearest_to_annulus(ax, ay, cx, cy, inner, outer, max_force):
+    # EMPTY: the force disc point that gets the speed closest to the allowed band
+    d = math.hypot(cx, cy)
+    if d == 0:
+        n = math.hypot(ax, ay)
+        return (ax / n * max_force, ay / n * max_force) if n > 0 else (max_force, 0.0)
+    if d + max_force < inner:                           # disc inside the hole: speed up as much as possible
+        return -cx / d * max_force, -cy / d * max_force
+    return cx / d * max_force, cy / d * max_force       # disc beyond the outer circle: slow down as much as possible
+
+
+def project(ax, ay, vx, vy, min_speed, max_speed, max_force, dt=1):
+    # ((x, y), code) of the feasible acceleration nearest to (ax, ay)
+    cx, cy = -vx / dt, -vy / dt
+    outer = max_speed / dt
+    inner = min(min_speed / dt, outer)
+    tol = eps * (1 + max_force + outer)
+    d = math.hypot(cx, cy)
+    if d - max_force > outer + tol or d + max_force < inner - tol:
+        return nearest_to_annulus(ax, ay, cx, cy, inner, outer, max_force), EMPTY
+
+    def feasible(x, y):
+        s = math.hypot(x - cx, y - cy)
+        return math.hypot(x, y) <= max_force + tol and inner - tol <= s <= outer + tol
+
+    if feasible(ax, ay):
+        return (ax, ay), ORIGNL
+
+    # directions used when the request sits exactly on a circle centre
+    towards_c = (cx, cy) if d > 0 else (1.0, 0.0)
+    towards_origin = (-cx, -cy) if d > 0 else (1.0, 0.0)
+    candidates = [
+        (radial(ax, ay, 0.0, 0.0, max_force, *towards_c), SCALED),
+        (radial(ax, ay, cx, cy, outer, *towards_origin), PROJEC),
+        (radial(ax, ay, cx, cy, inner, *towards_origin), PROJEC),
+    ]
+    for radius in (outer, inner):
+        candidates += [(point, INTSCT) for point in circle_vertices(0.0, 0.0, max_force, cx, cy, radius)]
+
+    best, code, closest = None, EMPTY, math.inf
+    for (x, y), kind in candidates:
+        distance = math.hypot(x - ax, y - ay)
+        if distance < closest and feasible(x, y):
+            best, code, closest = (x, y), kind, distance
+    if best is None:                                    # tangent to within rounding: numerically empty
+        return nearest_to_annulus(ax, ay, cx, cy, inner, outer, max_force), EMPTY
+    return best, code
+
+
+def radial_arrays(p, c, radius, fallback):
+    diff = p - c
+    n = np.hypot(diff[:, 0], diff[:, 1])
+    centre = n == 0
+    diff[centre] = fallback[centre]
+    n = np.hypot(diff[:, 0], diff[:, 1])
+    return c + diff / n[:, None] * radius[:, None]
+
+
+def vertex_arrays(c, r0, r1):
+    # crossings of the circles (0, r0) and (c, r1), both of shape (N, 2), plus a validity mask
+    d = np.hypot(c[:, 0], c[:, 1])
+    valid = (d > 0) & (d <= r0 + r1) & (d >= np.abs(r0 - r1))
+    safe = np.where(valid, d, 1.0)
+    a = (r0 * r0 - r1 * r1 + safe * safe) / (2 * safe)
+    h = np.sqrt(np.maximum(r0 * r0 - a * a, 0.0))
+    e = c / safe[:, None]
+    perp = np.stack([-e[:, 1], e[:, 0]], axis=1)
+    base = a[:, None] * e
+    return base + h[:, None] * perp, base - h[:, None] * perp, valid
+
+
+def project_arrays(acc, velocity, min_speed, max_speed, max_force, dt=1):
+    # Vectorised project(): acc, velocity (N, 2), min_speed scalar or (N,). Returns capped (N, 2) and codes (N,)
+    acc = np.asarray(acc, dtype=float)
+    n = len(acc)
+    c = -np.asarray(velocity, dtype=float) / dt
+    outer = np.full(n, max_speed / dt)
+    inner = np.minimum(np.broadcast_to(np.asarray(min_speed, dtype=float) / dt, (n,)), outer)
+    force = np.full(n, float(max_force))
+    tol = eps * (1 + force + outer)
+    d = np.hypot(c[:, 0], c[:, 1])
+    empty = (d - force > outer + tol) | (d + force < inner - tol)
+
+    has_c = (d > 0)[:, None]
+    towards_c = np.where(has_c, c, [1.0, 0.0])
+    towards_origin = np.where(has_c, -c, [1.0, 0.0])
+    zero = np.zeros_like(c)
+    outer_a, outer_b, outer_ok = vertex_arrays(c, force, outer)
+    inner_a, inner_b, inner_ok = vertex_arrays(c, force, inner)
+    points = np.stack([
+        acc,
+        radial_arrays(acc, zero, force, towards_c),
+        radial_arrays(acc, c, outer, towards_origin),
+        radial_arrays(acc, c, inner, towards_origin),
+        outer_a, outer_b, inner_a, inner_b,
+    ], axis=1)                                                          # (N, 8, 2)
+    kinds = np.array([ORIGNL, SCALED, PROJEC, PROJEC, INTSCT, INTSCT, INTSCT, INTSCT])
+    valid = np.ones((n, 8), dtype=bool)
+    valid[:, 4:6] = outer_ok[:, None]
+    valid[:, 6:8] = inner_ok[:, None]
+
+    speed = np.hypot(points[..., 0] - c[:, None, 0], points[..., 1] - c[:, None, 1])
+    feasible = valid & (np.hypot(points[..., 0], points[..., 1]) <= (force + tol)[:, None]) \
+        & (speed >= (inner - tol)[:, None]) & (speed <= (outer + tol)[:, None])
+    distance = np.hypot(points[..., 0] - acc[:, None, 0], points[..., 1] - acc[:, None, 1])
+    distance[:, 0] = -1.0                               # a feasible request is kept as it is
+    distance = np.where(feasible, distance, np.inf)
+    pick = np.argmin(distance, axis=1)
+    rows = np.arange(n)
+    capped = points[rows, pick]
+    code = kinds[pick]
+
+    empty |= ~feasible.any(axis=1)
+    for i in np.flatnonzero(empty):
+        capped[i] = nearest_to_annulus(acc[i, 0], acc[i, 1], c[i, 0], c[i, 1], inner[i], outer[i], max_force)
+        code[i] = EMPTY
+    return capped, code
+
+
+def closest_candidate(ax, ay, vx, vy, min_speed, max_speed, max_force, dt=1):
+    # The candidate enumerator main.py and Presentation1.py used, as a reference: (point or None, code)
+    cx, cy = -vx / dt, -vy / dt
+    possible = [((ax, ay), ORIGNL)]
+    n = math.hypot(ax, ay)
+    if n > 0:
+        possible.append(((ax / n * max_force, ay / n * max_force), SCALED))
+    if (ax, ay) != (cx, cy):
+        m = math.hypot(ax - cx, ay - cy)
+        ux, uy = (ax - cx) / m, (ay - cy) / m
+        for radius in (min_speed / dt, max_speed / dt):
+            possible += [((cx + ux * radius, cy + uy * radius), PROJEC), ((cx - ux * radius, cy - uy * radius), PROJEC)]
+    for radius in (max_speed / dt, min_speed / dt):
+        possible += [(point, INTSCT) for point in circle_vertices(0.0, 0.0, max_force, cx, cy, radius)]
+
+    best, code, closest = None, None, math.inf
+    for (x, y), kind in possible:
+        distance = math.hypot(x - ax, y - ay)
+        s = math.hypot(x - cx, y - cy)
+        if distance < closest and math.hypot(x, y) <= max_force + 1e-5 \
+                and max_speed / dt + 1e-5 >= s >= min_speed / dt - 1e-5:
+            best, code, closest = (x, y), kind, distance
+    return best, code
+
+
+def sequential_priority(ax, ay, vx, vy, min_speed, max_speed, max_force, dt=1):
+    # Hierarchy_decision.py's order: keep, scale to max_force, nearer annulus projection,
+    # nearest vertex; the first feasible one wins. (None, None) if none is
+    cx, cy = -vx / dt, -vy / dt
+    outer = max_speed / dt
+    inner = min(min_speed / dt, outer)
+    tol = eps * (1 + max_force + outer)
+
+    def feasible(x, y):
+        s = math.hypot(x - cx, y - cy)
+        return math.hypot(x, y) <= max_force + tol and inner - tol <= s <= outer + tol
+
+    if feasible(ax, ay):
+        return (ax, ay), ORIGNL
+    n = math.hypot(ax, ay)
+    if n > max_force:
+        point = (ax / n * max_force, ay / n * max_force)
+        if feasible(*point):
+            return point, SCALED
+    m = math.hypot(ax - cx, ay - cy)
+    if m > 0:
+        radius = outer if abs(m - outer) < abs(m - inner) else inner
+        point = (cx + (ax - cx) / m * radius, cy + (ay - cy) / m * radius)
+        if feasible(*point):
+            return point, PROJEC
+    vertices = [point for radius in (outer, inner) for point in circle_vertices(0.0, 0.0, max_force, cx, cy, radius)]
+    if vertices:
+        point = min(vertices, key=lambda v: math.hypot(v[0] - ax, v[1] - ay))
+        if feasible(*point):
+            return point, INTSCT
+    return None, None
+
+
+def with_fallback(strategy):
+    def capped(ax, ay, vx, vy, min_speed, max_speed, max_force, dt=1):
+        point, code = strategy(ax, ay, vx, vy, min_speed, max_speed, max_force, dt)
+        if point is None:
+            return project(ax, ay, vx, vy, min_speed, max_speed, max_force, dt)
+        return point, code
+    return capped
+
+
+strategies = {
+    "exact": project,
+    "closest": with_fallback(closest_candidate),
+    "sequential": with_fallback(sequential_priority),
+}
+
+
+def cap(strategy, ax, ay, vx, vy, min_speed, max_speed, max_force, dt=1):
+    return strategies[strategy](ax, ay, vx, vy, min_speed, max_speed, max_force, dt)
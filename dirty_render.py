@@ -0,0 +1,87 @@
+import pygame
+
+# Dirty-rectangle renderer. Static layers (POIs, walls, obstacles) are painted
+# once onto a cached background surface. Every frame, moving items are erased
+# by copying the background back over their old bounds, the items touching
+# those areas (and whatever touches them) are redrawn, and only those
+# rectangles are sent to the display. Items whose bounds miss the viewport
+# are skipped altogether, and nothing is painted outside it.
+#
+# An item is (key, state, rect, draw): key identifies it between frames, state
+# is anything that changes its picture, rect bounds what draw(surface) paints.
+
+
+class DirtyRenderer:
+    def __init__(self, screen, background=(0, 0, 0), viewport=None):
+        self.screen = screen
+        self.colour = background
+        self.viewport = pygame.Rect(viewport) if viewport is not None else screen.get_rect()
+        self.background = pygame.Surface(screen.get_size())     # plain until set_static paints a layer
+        self.background.fill(background)
+        self.static_key = None
+        self.drawn = {}                 # key -> (state, rect) as on screen now
+        self.full = True                # next frame repaints the whole viewport
+        self.updated = 0                # pixels sent to the display last frame
+
+    def set_static(self, key, draw):
+        # draw(surface) paints the static layer; it is only repainted when key changes
+        if key != self.static_key:
+            self.background = pygame.Surface(self.screen.get_size())
+            self.background.fill(self.colour)
+            draw(self.background)
+            self.static_key = key
+            self.full = True
+
+    def set_viewport(self, viewport):
+        viewport = pygame.Rect(viewport)
+        if viewport != self.viewport:
+            self.viewport = viewport
+            self.full = True
+
+    def render(self, items):
+        frame = [(key, state, rect, draw) for key, state, rect, draw in items if rect.colliderect(self.viewport)]
+        rects = [rect for _, _, rect, _ in frame]
+        dirty, redraw = [], range(len(frame))
+        if not self.full:
+            now = {key: (state, rect) for key, state, rect, _ in frame}
+            changed = [rect for key, (state, rect) in self.drawn.items() if now.get(key) != (state, rect)]    # old bounds
+            changed += [rect for key, (state, rect) in now.items() if self.drawn.get(key) != (state, rect)]   # new bounds
+            # Whatever touches a dirty area is repainted whole, which dirties its own bounds in turn
+            redraw = set()
+            pending = list(changed)
+            while pending:
+                for i in pending.pop().collidelistall(rects):
+                    if i not in redraw:
+                        redraw.add(i)
+                        changed.append(rects[i])
+                        pending.append(rects[i])
+            dirty = [rect.clip(self.viewport) for rect in changed]
+            dirty = [rect for rect in dirty if rect.width and rect.height]
+            if sum(rect.width * rect.height for rect in dirty) >= self.viewport.width * self.viewport.height:
+                self.full = True                            # cheaper to repaint everything once
+                redraw = range(len(frame))
+
+        self.screen.set_clip(self.viewport)
+        if self.full:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for area in dirty:
+                self.screen.blit(self.background, area, area)
+        for i in sorted(redraw):                            # in drawing order, so overlaps stack as before
+            frame[i][3](self.screen)
+        self.screen.set_clip(None)
+
+        if self.full:
+            pygame.display.update(self.viewport)
+            self.updated = self.viewport.width * self.viewport.height
+            self.full = False
+        else:
+            pygame.display.update(dirty)
+            self.updated = sum(rect.width * rect.height for rect in dirty)
+        self.drawn = {key: (state, rect) for key, state, rect, _ in frame}
+
+
+def line_rect(start, end, width=1):     # bounds of pygame.draw.line(start, end, width)
+    x0, x1 = sorted((start[0], end[0]))
+    y0, y1 = sorted((start[1], end[1]))
+    return pygame.Rect(int(x0) - width, int(y0) - width, int(x1 - x0) + 2 * width + 2, int(y1 - y0) + 2 * width + 2)
@@ -0,0 +1,128 @@
+import numpy as np
+
+import morton
+
+# Fused flocking kernel: every neighbour is visited once, and the sums needed by
+# align, cohesion and separation are accumulated in the same pass
+
+
+class Neighbourhood:
+    def __init__(self):
+        self.neighbours = []                # boids within the perception radius
+        self.total = 0
+        self.velocity_sum = None            # sum of neighbour velocities          (align)
+        self.position_sum = None            # sum of neighbour positions           (cohesion)
+        self.repulsion_sum = None           # sum of (self - other) / distance**power (separation)
+
+
+def accumulate(boid, boids, radius, power=2):
+    # Object model: one scan over boids
+    flock = Neighbourhood()
+    position = boid.position
+    flock.velocity_sum = position * 0           # zero vectors of the same type as the positions
+    flock.position_sum = position * 0
+    flock.repulsion_sum = position * 0
+    for other in boids:
+        if other is boid:
+            continue
+        diff = position - other.position
+        distance = diff.length()
+        if distance < radius:
+            flock.neighbours.append(other)
+            flock.velocity_sum += other.velocity
+            flock.position_sum += other.position
+            if distance > 0:
+                flock.repulsion_sum += diff / distance**power
+    flock.total = len(flock.neighbours)
+    return flock
+
+
+def accumulate_pairs(positions, velocities, i, j, power=2):
+    # Array backend: sums over directed pairs (i sees j), e.g. from a neighbour list
+    n = len(positions)
+    counts = np.bincount(i, minlength=n)
+    velocity_sum = np.zeros((n, 2))
+    position_sum = np.zeros((n, 2))
+    repulsion_sum = np.zeros((n, 2))
+    diff = positions[i] - positions[j]
+    distance = np.hypot(diff[:, 0], diff[:, 1])
+    inv = np.zeros_like(distance)
+    np.power(distance, -float(power), out=inv, where=distance > 0)
+    for k in range(2):
+        velocity_sum[:, k] = np.bincount(i, weights=velocities[j, k], minlength=n)
+        position_sum[:, k] = np.bincount(i, weights=positions[j, k], minlength=n)
+        repulsion_sum[:, k] = np.bincount(i, weights=diff[:, k] * inv, minlength=n)
+    return counts, velocity_sum, position_sum, repulsion_sum
+
+
+def neighbour_pairs(positions, radius):
+    # Brute-force distance matrix, fine for a few hundred boids
+    diff = positions[:, None, :] - positions[None, :, :]
+    distance_sq = np.einsum("ijk,ijk->ij", diff, diff)
+    np.fill_diagonal(distance_sq, np.inf)
+    return np.nonzero(distance_sq < radius**2)
+
+
+def grid_pairs(positions, radius):
+    # Cell-binned pairs. Cells are keyed by Morton code, so once the rows are
+    # Morton sorted (SwarmBuffers.sort_by_morton) every cell is a run of adjacent rows
+    cell = morton.cells(positions, radius)
+    key = morton.codes(cell)
+    order = np.argsort(key, kind="stable")
+    _, starts, counts = np.unique(key[order], return_index=True, return_counts=True)
+    runs = {tuple(cell[order[start]]): (start, start + count) for start, count in zip(starts, counts)}
+
+    pairs_i, pairs_j = [], []
+    for (cx, cy), (start, end) in runs.items():
+        a = order[start:end]
+        pa = positions[a]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                run = runs.get((cx + dx, cy + dy))
+                if run is None:
+                    continue
+                b = order[run[0]:run[1]]
+                diff = pa[:, None, :] - positions[b][None, :, :]
+                near = (np.einsum("ijk,ijk->ij", diff, diff) < radius**2) & (a[:, None] != b[None, :])
+                ii, jj = np.nonzero(near)
+                pairs_i.append(a[ii])
+                pairs_j.append(b[jj])
+    if not pairs_i:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def pairs(positions, radius, method="brute"):
+    # directed pairs (i sees j) by the chosen method
+    if method == "grid":
+        return grid_pairs(positions, radius)
+    return neighbour_pairs(positions, radius)
+
+
+def scale_to_length(vectors, length):
+    norm = np.hypot(vectors[:, 0], vectors[:, 1])
+    scale = np.divide(length, norm, out=np.zeros_like(norm), where=norm > 0)
+    return vectors * scale[:, None]
+
+
+def limit(vectors, length):
+    norm = np.hypot(vectors[:, 0], vectors[:, 1])
+    scale = np.divide(length, norm, out=np.ones_like(norm), where=norm > length)
+    return vectors * scale[:, None]
+
+
+def steer(desired, velocities, max_speed, max_force):
+    # scale_to_length(max_speed), subtract velocity, cap at max_force; zero where nothing is desired
+    norm = np.hypot(desired[:, 0], desired[:, 1])
+    steering = limit(scale_to_length(desired, max_speed) - velocities, max_force)
+    return np.where((norm > 0)[:, None], steering, 0)
+
+
+def steering_arrays(positions, velocities, counts, velocity_sum, position_sum, repulsion_sum, max_speed, max_force):
+    # Array form of align + cohesion + separation as written in simulation.py / leadersim.py
+    has = (counts > 0)[:, None]
+    total = np.maximum(counts, 1)[:, None]
+    align = steer(np.where(has, velocity_sum / total, 0), velocities, max_speed, max_force)
+    cohesion = steer(np.where(has, position_sum / total - positions, 0), velocities, max_speed, max_force)
+    separation = steer(np.where(has, repulsion_sum / total, 0), velocities, max_speed, max_force)
+    return align, cohesion, separation
@@ -0,0 +1,95 @@
+import warnings
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from snapshots import Snapshot
+
+# Shared-memory ring of frame slots between a simulation process (writer) and a
+# viewer process (reader). The writer never waits: it fills the next slot and
+# then advertises it as the latest. Each slot carries its sequence number, set
+# to -1 while the slot is being written, so a reader that copies a slot and
+# finds the number unchanged afterwards knows the copy is whole (a seqlock).
+#
+# Layout, all float64: header [latest sequence, closed flag], then per slot
+# [sequence, time, tick, POI count], boids (capacity, 4) as x, y, angle, rank
+# and POIs (poi_capacity, 2). Labels never change and are passed to the viewer once.
+# The slots cannot grow once the viewer has mapped them, so size poi_capacity
+# for the run; POIs past it are left out of the frame with a warning.
+
+
+class FrameRing:
+    def __init__(self, capacity, poi_capacity=256, slots=4, name=None):
+        self.capacity = capacity
+        self.poi_capacity = poi_capacity
+        self.slots = slots
+        self.slot_size = 4 + capacity * 4 + poi_capacity * 2
+        size = (2 + slots * self.slot_size) * 8
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.data = np.ndarray((2 + slots * self.slot_size,), dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.data[:] = 0
+            self.data[0] = -1
+        self.written = 0
+        self.overflow = 0               # frames that had to leave POIs out
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def slot(self, sequence):           # (meta, boids, POIs) views of the slot holding `sequence`
+        start = 2 + int(sequence) % self.slots * self.slot_size
+        meta = self.data[start:start + 4]
+        boids = self.data[start + 4:start + 4 + self.capacity * 4].reshape(self.capacity, 4)
+        POIs = self.data[start + 4 + self.capacity * 4:start + self.slot_size].reshape(self.poi_capacity, 2)
+        return meta, boids, POIs
+
+    def publish(self, snapshot):        # writer side, never blocks; POIs beyond poi_capacity are not sent
+        if len(snapshot.POIs) > self.poi_capacity:
+            if not self.overflow:
+                warnings.warn(f"{len(snapshot.POIs)} POIs do not fit the frame ring (poi_capacity {self.poi_capacity}), "
+                              "the viewer only gets the first ones", RuntimeWarning)
+            self.overflow += 1
+        sequence = self.written
+        meta, boids, POIs = self.slot(sequence)
+        meta[0] = -1
+        n = min(len(snapshot.boids), self.capacity)
+        if n:
+            boids[:n] = [boid[:4] for boid in snapshot.boids[:n]]
+        m = min(len(snapshot.POIs), self.poi_capacity)
+        if m:
+            POIs[:m] = snapshot.POIs[:m]
+        meta[1:4] = snapshot.time, snapshot.tick, m
+        meta[0] = sequence
+        self.data[0] = sequence
+        self.written += 1
+
+    def latest(self, labels, tries=3):
+        # reader side: newest whole frame as a Snapshot (no edges), None if nothing consistent yet
+        for _ in range(tries):
+            sequence = self.data[0]
+            if sequence < 0:
+                return None
+            meta, boids, POIs = self.slot(sequence)
+            if meta[0] != sequence:
+                continue
+            time, tick, m = meta[1], int(meta[2]), int(meta[3])
+            boids, POIs = boids.copy(), POIs[:m].copy()
+            if meta[0] == sequence:
+                return Snapshot(time, tick, [(x, y, angle, int(rank), label) for (x, y, angle, rank), label in zip(boids.tolist(), labels)],
+                                [], [tuple(poi) for poi in POIs.tolist()])
+        return None
+
+    @property
+    def closed(self):
+        return self.data[1] != 0
+
+    def close_viewer(self):             # the viewer tells the writer it is gone
+        self.data[1] = 1
+
+    def close(self):
+        del self.data
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
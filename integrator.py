@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+import periodic
+
+# Adaptive time step for main.py. Every step picks dt from how close the swarm
+# is to its constraints: no pair of neighbours may close more than a fraction
+# `approach` of the gap between them in one step, and no boid heading for a POI
+# may cover more than that fraction of the distance left to the arrival circle.
+# World edges are different, since boids only bounce once they are past one:
+# a step may carry a boid at most `overshoot` beyond the edge it is heading for.
+# All three allow for the current closing speed plus full acceleration, so a calm
+# swarm takes long steps and near-collisions and arrivals are sub-stepped.
+# dt grows by at most `growth` per step and stays within [dt_min, dt_max],
+# except that the last step of a tick may be shorter to end on the tick;
+# the capping geometry follows because it is always given the step length.
+
+
+def time_to_gap(gap, closing, accel, approach):
+    # largest dt with closing * dt + accel * dt**2 / 2 <= approach * gap, element-wise
+    gap = np.maximum(np.asarray(gap, dtype=float), 0)
+    closing = np.maximum(np.asarray(closing, dtype=float), 0)
+    return (-closing + np.sqrt(closing ** 2 + 2 * accel * approach * gap)) / accel
+
+
+def pair_gaps(graph, positions, velocities, moving, period=None):
+    # (gap, closing speed) of every graph edge with at least one moving end
+    offsets, indices = graph.offsets, graph.indices
+    rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    keep = moving[rows] | moving[indices]
+    rows, cols, gap = rows[keep], indices[keep], graph.distances[keep]
+    if not len(rows):
+        return gap, gap
+    d = periodic.offset_arrays(positions[cols] - positions[rows], period)
+    relative = velocities[cols] - velocities[rows]
+    closing = -(d * relative).sum(axis=1) / np.maximum(gap, 1e-9)
+    return gap, closing
+
+
+class AdaptiveStep:
+    def __init__(self, max_force, dt_min=0.125, dt_max=4.0, approach=0.25, growth=2.0, overshoot=4.0):
+        self.max_force = max_force
+        self.overshoot = overshoot
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.approach = approach
+        self.growth = growth
+        self.last = None                # dt chosen last step, before trimming to a tick boundary
+        self.steps = 0
+        self.time = 0.0
+
+    def choose(self, pairs, arrivals, left=math.inf, edges=None):
+        # pairs, arrivals, edges: (gap, closing speed) arrays; left: time to the end of the tick, if any.
+        # Only a step that ends the tick goes below dt_min, and only when less than that is left.
+        dt = self.dt_max
+        for (gap, closing), accel in ((pairs, 2 * self.max_force), (arrivals, self.max_force)):
+            if len(gap):
+                dt = min(dt, float(time_to_gap(gap, closing, accel, self.approach).min()))
+        if edges is not None and len(edges[0]):
+            dt = min(dt, float(time_to_gap(edges[0] + self.overshoot, edges[1], self.max_force, 1).min()))
+        if self.last is not None:
+            dt = min(dt, self.last * self.growth)
+        dt = self.last = max(dt, self.dt_min)
+        if left <= dt:
+            dt = left
+        elif left < dt + self.dt_min and left >= 2 * self.dt_min:     # split what is left rather than end on a sliver
+            dt = left / 2
+        self.steps += 1
+        self.time += dt
+        return dt
@@ -0,0 +1,84 @@
+import heapq
+
+import periodic
+
+# 2-d tree over boid positions, built once per tick, for k-nearest-neighbour
+# (topological) perception. Implicit balanced layout: the node of the range
+# [lo, hi) is the median at (lo + hi) // 2, split on x at even depth, y at odd.
+# With a period (width, height) the query is repeated for the images of the
+# point across the seams, giving minimum-image neighbours.
+
+
+class KDTree:
+    def __init__(self, points):
+        self.points = [(p[0], p[1]) for p in points]
+        self.order = list(range(len(self.points)))
+        self.build(0, len(self.order), 0)
+        self.xs = [self.points[i][0] for i in self.order]
+        self.ys = [self.points[i][1] for i in self.order]
+
+    def build(self, lo, hi, depth):
+        if hi - lo <= 1:
+            return
+        axis = depth % 2
+        self.order[lo:hi] = sorted(self.order[lo:hi], key=lambda i: self.points[i][axis])
+        mid = (lo + hi) // 2
+        self.build(lo, mid, depth + 1)
+        self.build(mid + 1, hi, depth + 1)
+
+    def knn(self, point, k, radius=float('inf'), exclude=None, period=None):
+        # indices of the k nearest points strictly within radius, nearest first
+        if period is not None:
+            radius = min(radius, min(period) / 2)       # beyond half the period images would repeat
+        best = []                                       # max-heap of (-distance_sq, index)
+        limit = radius * radius
+        xs, ys, order = self.xs, self.ys, self.order
+
+        def search(lo, hi, depth):
+            nonlocal limit
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            dx, dy = xs[mid] - x, ys[mid] - y
+            d2 = dx * dx + dy * dy
+            if d2 < limit and order[mid] != exclude:
+                heapq.heappush(best, (-d2, order[mid]))
+                if len(best) > k:
+                    heapq.heappop(best)
+                if len(best) == k:
+                    limit = min(limit, -best[0][0])     # only closer points can still enter
+            delta = dx if depth % 2 == 0 else dy        # node minus query along the split axis
+            near, far = ((lo, mid), (mid + 1, hi)) if delta > 0 else ((mid + 1, hi), (lo, mid))
+            search(near[0], near[1], depth + 1)
+            if delta * delta < limit:
+                search(far[0], far[1], depth + 1)
+
+        if k > 0:
+            for sx, sy in periodic.image_shifts(point, radius, period):
+                x, y = point[0] + sx, point[1] + sy
+                search(0, len(order), 0)
+        return [index for _, index in sorted(best, reverse=True)]
+
+
+class KNearestIndex:
+    # Neighbour search for main.py: each boid perceives its k nearest boids within radius
+    def __init__(self, k, radius=float('inf'), period=None):
+        self.k = k
+        self.radius = radius
+        self.period = period
+        self.tree = None
+        self.boids = []
+        self.index = {}
+        self.cache = {}
+
+    def update(self, boids):            # once per tick
+        self.boids = list(boids)
+        self.index = {boid: i for i, boid in enumerate(self.boids)}
+        self.tree = KDTree([(boid.position.x, boid.position.y) for boid in self.boids])
+        self.cache = {}
+
+    def neighbours(self, boid):
+        if boid not in self.cache:
+            found = self.tree.knn(boid.position, self.k, self.radius, exclude=self.index.get(boid), period=self.period)
+            self.cache[boid] = [self.boids[i] for i in found]
+        return self.cache[boid]
@@ -0,0 +1,79 @@
+import math
+
+# Leader lookup for many leaders: a uniform grid over leader positions answers
+# "nearest leader" without scanning every leader, and assignments are cached
+# until a leader (or the boid) has moved far enough to change the answer
+
+
+class LeaderGrid:
+    def __init__(self, leaders, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        for leader in leaders:
+            self.cells.setdefault(self.cell(leader.position), []).append(leader)
+        if self.cells:
+            self.low = min(x for x, _ in self.cells), min(y for _, y in self.cells)
+            self.high = max(x for x, _ in self.cells), max(y for _, y in self.cells)
+
+    def cell(self, position):
+        return int(math.floor(position.x / self.cell_size)), int(math.floor(position.y / self.cell_size))
+
+    def nearest(self, position):
+        if not self.cells:
+            return None
+        cx, cy = self.cell(position)
+        best, best_distance = None, float('inf')
+        ring = 0
+        while True:
+            # Visit the square ring of cells at Chebyshev distance `ring`
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue
+                    for leader in self.cells.get((x, y), ()):
+                        distance = position.distance_to(leader.position)
+                        if distance < best_distance:
+                            best, best_distance = leader, distance
+            # Anything in further rings is at least ring * cell_size away
+            if best is not None and best_distance <= ring * self.cell_size:
+                return best
+            # Every occupied cell has been visited
+            if ring >= max(cx - self.low[0], self.high[0] - cx, cy - self.low[1], self.high[1] - cy):
+                return best
+            ring += 1
+
+
+class LeaderAssignment:
+    def __init__(self, cell_size, reassign_distance):
+        self.cell_size = cell_size
+        self.reassign_distance = reassign_distance      # how far a leader or boid may move before reassigning
+        self.grid = None
+        self.leader_positions = {}                      # leader -> position when the grid was built
+        self.assigned = {}                              # boid -> (leader, boid position when assigned)
+        self.squads = {}                                # boid -> fixed leader, overrides the nearest lookup
+
+    def assign_squads(self, boids, leaders):
+        # Split the flock between the leaders, each boid keeps its leader for the whole run
+        for i, boid in enumerate(boids):
+            self.squads[boid] = leaders[i % len(leaders)]
+
+    def update(self, leaders):
+        moved = len(leaders) != len(self.leader_positions) or any(
+            leader not in self.leader_positions
+            or leader.position.distance_to(self.leader_positions[leader]) > self.reassign_distance
+            for leader in leaders)
+        if moved:
+            self.grid = LeaderGrid(leaders, self.cell_size)
+            self.leader_positions = {leader: leader.position.copy() for leader in leaders}
+            self.assigned = {}
+
+    def leader_of(self, boid):
+        if boid in self.squads:
+            return self.squads[boid]
+        if boid in self.assigned:
+            leader, position = self.assigned[boid]
+            if boid.position.distance_to(position) <= self.reassign_distance:
+                return leader
+        leader = self.grid.nearest(boid.position)
+        self.assigned[boid] = (leader, boid.position.copy())
+        return leader
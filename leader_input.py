@@ -0,0 +1,101 @@
+import json
+
+import pygame
+
+# Leader controllers: each returns the leader's velocity for the current tick
+#   KeyboardController:  arrow keys, as in the interactive leadersim
+#   RecordedController:  replays a recorded list of directions, tick by tick
+#   WaypointController:  steers along a path of waypoints
+#   InputRecorder:       wraps a controller and records what it did, for replay
+
+directions = {
+    "up": (0, -1),
+    "down": (0, 1),
+    "left": (-1, 0),
+    "right": (1, 0),
+    "stop": (0, 0),
+}
+
+
+class KeyboardController:
+    def direction(self):
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_UP]:
+            return "up"
+        elif keys[pygame.K_DOWN]:
+            return "down"
+        elif keys[pygame.K_LEFT]:
+            return "left"
+        elif keys[pygame.K_RIGHT]:
+            return "right"
+        return "stop"
+
+    def velocity(self, leader, speed):
+        return pygame.math.Vector2(directions[self.direction()]) * speed
+
+
+class RecordedController:
+    def __init__(self, moves, loop=False):
+        self.moves = list(moves)        # one direction name per tick
+        self.loop = loop
+        self.tick = 0
+
+    @classmethod
+    def load(cls, path, loop=False):
+        with open(path) as f:
+            runs = json.load(f)         # run-length encoded: [[direction, ticks], ...]
+        return cls([move for move, ticks in runs for _ in range(ticks)], loop=loop)
+
+    def direction(self):
+        if self.tick >= len(self.moves):
+            if not self.loop or not self.moves:
+                return "stop"
+            self.tick = 0
+        move = self.moves[self.tick]
+        self.tick += 1
+        return move
+
+    def velocity(self, leader, speed):
+        return pygame.math.Vector2(directions[self.direction()]) * speed
+
+
+class WaypointController:
+    def __init__(self, waypoints, loop=True):
+        self.waypoints = [pygame.math.Vector2(p) for p in waypoints]
+        self.loop = loop
+        self.current = 0
+
+    def velocity(self, leader, speed):
+        for _ in range(len(self.waypoints)):
+            if self.current >= len(self.waypoints):
+                if not self.loop:
+                    break
+                self.current = 0
+            offset = self.waypoints[self.current] - leader.position
+            if offset.length() > speed:
+                return offset / offset.length() * speed
+            if offset.length() > 0:
+                return offset                       # land exactly on the waypoint
+            self.current += 1                       # reached, go to the next one
+        return pygame.math.Vector2(0, 0)
+
+
+class InputRecorder:
+    def __init__(self, controller):
+        self.controller = controller    # must provide direction(), e.g. KeyboardController
+        self.moves = []
+
+    def velocity(self, leader, speed):
+        move = self.controller.direction()
+        self.moves.append(move)
+        return pygame.math.Vector2(directions[move]) * speed
+
+    def save(self, path):
+        runs = []
+        for move in self.moves:
+            if runs and runs[-1][0] == move:
+                runs[-1][1] += 1
+            else:
+                runs.append([move, 1])
+        with open(path, "w") as f:
+            json.dump(runs, f)
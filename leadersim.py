@@ -1,6 +1,13 @@
 import pygame
 import random
 import math
+import concurrent.futures
+
+import flocking
+import stepping
+from leader_input import KeyboardController, InputRecorder, WaypointController
+from leader_index import LeaderAssignment
+from wall_bvh import WallBVH
 
 scale = 1
 
@@ -12,9 +19,14 @@ num_boids = 10
 max_speed = 4 * scale
 max_force = 0.1 * scale
 perception_radius = 50
+update_mode = "inplace"     # "inplace": boid by boid, "sync": double-buffered compute/commit
 
 # Leader properties
 leader_speed = 4 * scale
+record_path = None          # e.g. "leader_run.json" to record the keyboard session for replay
+num_leaders = 1             # leader 0 is keyboard steered, the others patrol random waypoints
+leader_mode = "nearest"     # "nearest": follow the closest leader, "squad": fixed split of the flock
+reassign_distance = perception_radius   # leader/boid movement before the nearest leader is looked up again
 
 # Obstacle properties
 max_force_avoidance = 0.3 * scale
@@ -31,13 +43,16 @@ class Boid:
         self.velocity = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))
         self.velocity.scale_to_length(max_speed)
         self.acceleration = pygame.math.Vector2(0, 0)
+        self.neighbours = []
 
     def apply_behavior(self, boids, obstacles, walls, leader):
+        flock = flocking.accumulate(self, boids, perception_radius, power=1)   # single pass over boids
+        self.neighbours = flock.neighbours
         self.acceleration = pygame.math.Vector2(0, 0)
         self.acceleration += self.follow_leader(leader)  
-        self.acceleration += self.align(boids)
-        self.acceleration += self.cohesion(boids)
-        self.acceleration += self.separation(boids)
+        self.acceleration += self.align(flock)
+        self.acceleration += self.cohesion(flock)
+        self.acceleration += self.separation(flock)
         self.acceleration += self.avoid_obstacle(obstacles)
         self.acceleration += self.avoid_walls(walls)
         
@@ -52,30 +67,20 @@ class Boid:
                 steering.scale_to_length(max_force)
         return steering
 
-    def align(self, boids):
+    def align(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                steering += boid.velocity
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.velocity_sum / flock.total
             steering.scale_to_length(max_speed)
             steering -= self.velocity
             if steering.length() > max_force:
                 steering.scale_to_length(max_force)
         return steering
 
-    def cohesion(self, boids):
+    def cohesion(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                steering += boid.position
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.position_sum / flock.total
             steering -= self.position
             steering.scale_to_length(max_speed)
             steering -= self.velocity
@@ -83,28 +88,19 @@ class Boid:
                 steering.scale_to_length(max_force)
         return steering
 
-    def separation(self, boids):
+    def separation(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            distance = self.position.distance_to(boid.position)
-            if boid != self and distance < perception_radius:
-                diff = self.position - boid.position
-                diff /= distance
-                steering += diff
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.repulsion_sum / flock.total
             steering.scale_to_length(max_speed)
             steering -= self.velocity
             if steering.length() > max_force:
                 steering.scale_to_length(max_force)
         return steering
     
-    def show_perception(self, boids, screen):
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                pygame.draw.line(screen, red, self.position, boid.position, 2)
+    def show_perception(self, screen):                 # neighbours gathered in apply_behavior
+        for boid in self.neighbours:
+            pygame.draw.line(screen, red, self.position, boid.position, 2)
     
     def avoid_edges(self):
         steering = pygame.math.Vector2(0, 0)
@@ -141,12 +137,10 @@ class Boid:
     
     def avoid_walls(self, walls):
         steering = pygame.math.Vector2(0, 0)
-        for wall in walls:
-            distance = wall.distance_to(self.position)
-            if distance < perception_radius:
-                # Get vector perpendicular to the wall
-                perp = wall.get_perpendicular(self.position)
-                steering += perp
+        for wall in walls.query(self.position, perception_radius):     # only walls within perception_radius
+            # Get vector perpendicular to the wall
+            perp = wall.get_perpendicular(self.position)
+            steering += perp
         if steering.length() > 0:
             steering.scale_to_length(max_speed)
             steering -= self.velocity
@@ -169,23 +163,13 @@ class Boid:
         ])
 
 class Leader:
-    def __init__(self):
-        self.position = pygame.math.Vector2(50, 50)
+    def __init__(self, controller=None, position=(50, 50)):
+        self.position = pygame.math.Vector2(position)
         self.velocity = pygame.math.Vector2(0, 0)
+        self.controller = controller if controller is not None else KeyboardController()
 
     def update(self):
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_UP]:
-            self.velocity = pygame.math.Vector2(0, -leader_speed)
-        elif keys[pygame.K_DOWN]:
-            self.velocity = pygame.math.Vector2(0, leader_speed)
-        elif keys[pygame.K_LEFT]:
-            self.velocity = pygame.math.Vector2(-leader_speed, 0)
-        elif keys[pygame.K_RIGHT]:
-            self.velocity = pygame.math.Vector2(leader_speed, 0)
-        else:
-            self.velocity = pygame.math.Vector2(0, 0)
-
+        self.velocity = self.controller.velocity(self, leader_speed)
         self.position += self.velocity
 
     def show(self, screen):
@@ -233,22 +217,74 @@ class Wall:
             perp_vector = -perp_vector
         return perp_vector.normalize()
 
+def create_walls():
+    walls = [
+        Wall(100, 0, 100, 500),
+        Wall(300, 100, 300, 600),
+        Wall(500, 0, 500, 500),
+        Wall(700, 100, 700, 600),
+    ]
+    return WallBVH(walls)       # spatial index over the wall segments, iterates like the list
+
+def create_leaders(controllers):
+    leaders = [Leader(controllers[0])]
+    for controller in controllers[1:]:
+        leaders.append(Leader(controller, position=(random.uniform(0, width), random.uniform(0, height))))
+    return leaders
+
+def patrol_controller():
+    return WaypointController([(random.uniform(0, width), random.uniform(0, height)) for _ in range(4)])
+
+def create_assignment(boids, leaders):
+    assignment = LeaderAssignment(cell_size=perception_radius * 2, reassign_distance=reassign_distance)
+    if leader_mode == "squad":
+        assignment.assign_squads(boids, leaders)
+    return assignment
+
+def step(boids, obstacles, walls, leaders, assignment, executor=None):
+    for leader in leaders:
+        leader.update()  # Update the leaders from their controllers
+    assignment.update(leaders)
+
+    # Flock boids follow their leader
+    behave = lambda boid: boid.apply_behavior(boids, obstacles, walls, assignment.leader_of(boid))
+    if update_mode == "inplace":
+        stepping.step_inplace(boids, behave)
+    elif update_mode == "sync":
+        stepping.step_synchronous(boids, behave, executor)
+
+def run_headless(controllers, ticks, boids=None):
+    # No display and no frame pacing, e.g. RecordedController or WaypointController runs
+    leaders = create_leaders(controllers)
+    if boids is None:
+        boids = [Boid() for _ in range(num_boids)]
+    obstacles = []
+    walls = create_walls()
+    assignment = create_assignment(boids, leaders)
+    executor = concurrent.futures.ThreadPoolExecutor() if update_mode == "sync" else None
+    for _ in range(ticks):
+        step(boids, obstacles, walls, leaders, assignment, executor)
+    if executor is not None:
+        executor.shutdown()
+    return leaders, boids
+
 def main():
     pygame.init()
     screen = pygame.display.set_mode((width, height))
     clock = pygame.time.Clock()
 
-    leader = Leader()  # Create the leader
+    controller = KeyboardController()
+    if record_path is not None:
+        controller = InputRecorder(controller)
+    leaders = create_leaders([controller] + [patrol_controller() for _ in range(num_leaders - 1)])  # Create the leaders
     boids = [Boid() for _ in range(num_boids)]  # Flock of boids
+    assignment = create_assignment(boids, leaders)
 
     # Obstacles and walls remain the same
     obstacles = []
-    walls = [
-        Wall(100, 0, 100, 500),
-        Wall(300, 100, 300, 600),
-        Wall(500, 0, 500, 500),
-        Wall(700, 100, 700, 600),
-    ]
+    walls = create_walls()
+
+    executor = concurrent.futures.ThreadPoolExecutor() if update_mode == "sync" else None
 
     running = True
     while running:
@@ -258,13 +294,12 @@ def main():
 
         screen.fill(black)
 
-        leader.update()  # Update the leader based on user input
-        leader.show(screen)  # Display the leader
+        step(boids, obstacles, walls, leaders, assignment, executor)
+        for leader in leaders:
+            leader.show(screen)  # Display the leaders
 
         for boid in boids:
-            boid.show_perception(boids, screen)
-            boid.apply_behavior(boids, obstacles, walls, leader)  # Flock boids follow the leader
-            boid.update()
+            boid.show_perception(screen)
             boid.show(screen)
 
         for obstacle in obstacles:
@@ -276,6 +311,10 @@ def main():
         pygame.display.flip()
         clock.tick(30)
 
+    if executor is not None:
+        executor.shutdown()
+    if record_path is not None:
+        controller.save(record_path)
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+import math
+
+import periodic
+
+# Adaptive loose quadtree for clustered swarms. Leaves split when they hold more
+# than `capacity` boids and subtrees merge back once they hold half that, so the
+# tree follows the swarm from tick to tick. A boid only changes leaf when it
+# leaves the leaf's loose box (the tight box grown by `looseness`), which keeps
+# reinsertions rare while boids jitter around cell borders.
+
+
+class Node:
+    def __init__(self, x0, y0, x1, y1, looseness):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        grow = (looseness - 1) / 2 * max(x1 - x0, y1 - y0)
+        self.lx0, self.ly0, self.lx1, self.ly1 = x0 - grow, y0 - grow, x1 + grow, y1 + grow
+        self.items = []                 # boids held here; inner nodes only keep boids outside every child's loose box
+        self.children = None
+        self.count = 0                  # boids in the subtree
+
+    def loose_contains(self, position):
+        return self.lx0 <= position.x < self.lx1 and self.ly0 <= position.y < self.ly1
+
+    def child_for(self, position):
+        mx, my = (self.x0 + self.x1) / 2, (self.y0 + self.y1) / 2
+        return self.children[(position.x >= mx) * 2 + (position.y >= my)]
+
+    def loose_distance(self, x, y):
+        dx = max(self.lx0 - x, 0, x - self.lx1)
+        dy = max(self.ly0 - y, 0, y - self.ly1)
+        return math.hypot(dx, dy)
+
+
+class LooseQuadtree:
+    def __init__(self, radius, bounds, capacity=16, looseness=1.5, min_size=None, period=None):
+        self.radius = radius
+        self.bounds = bounds            # (x0, y0, x1, y1) of the world
+        self.capacity = capacity
+        self.looseness = looseness
+        self.min_size = min_size if min_size is not None else radius / 4
+        self.period = period
+        self.root = Node(*bounds, looseness)
+        self.root.lx0 = self.root.ly0 = -math.inf          # the root keeps everything, even boids outside the world
+        self.root.lx1 = self.root.ly1 = math.inf
+        self.owner = {}                 # boid -> node holding it
+        self.cache = {}
+
+    def insert(self, boid, node=None):
+        node = node if node is not None else self.root
+        while node.children is not None:
+            child = node.child_for(boid.position)
+            if not child.loose_contains(boid.position):
+                break
+            node = child
+        node.items.append(boid)
+        self.owner[boid] = node
+
+    def remove(self, boid):
+        self.owner.pop(boid).items.remove(boid)
+
+    def update(self, boids):            # once per tick
+        present = set(boids)
+        for boid in [b for b in self.owner if b not in present]:
+            self.remove(boid)
+        for boid in boids:
+            leaf = self.owner.get(boid)
+            if leaf is None:
+                self.insert(boid)
+            elif not leaf.loose_contains(boid.position):
+                self.remove(boid)
+                self.insert(boid)
+        self.rebalance(self.root)
+        self.cache = {}
+
+    def rebalance(self, node):          # split crowded leaves, merge sparse subtrees; returns the count
+        if node.children is None:
+            node.count = len(node.items)
+            if node.count > self.capacity and (node.x1 - node.x0) / 2 >= self.min_size:
+                self.split(node)
+                node.count = len(node.items) + sum(self.rebalance(child) for child in node.children)
+            return node.count
+        node.count = len(node.items) + sum(self.rebalance(child) for child in node.children)
+        if node.count <= self.capacity // 2:
+            self.merge(node)
+        return node.count
+
+    def split(self, node):
+        mx, my = (node.x0 + node.x1) / 2, (node.y0 + node.y1) / 2
+        node.children = [
+            Node(node.x0, node.y0, mx, my, self.looseness),
+            Node(node.x0, my, mx, node.y1, self.looseness),
+            Node(mx, node.y0, node.x1, my, self.looseness),
+            Node(mx, my, node.x1, node.y1, self.looseness),
+        ]
+        items, node.items = node.items, []
+        for boid in items:
+            self.insert(boid, node)
+
+    def merge(self, node):
+        stack = list(node.children)
+        node.children = None
+        while stack:
+            child = stack.pop()
+            if child.children is not None:
+                stack.extend(child.children)
+            for boid in child.items:
+                node.items.append(boid)
+                self.owner[boid] = node
+
+    def query(self, position, radius, exclude=None):
+        found = []
+        for sx, sy in periodic.image_shifts((position.x, position.y), radius, self.period):
+            x, y = position.x + sx, position.y + sy
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                if node.loose_distance(x, y) >= radius:
+                    continue
+                if node.children is not None:
+                    stack.extend(node.children)
+                for boid in node.items:
+                    if boid is not exclude and math.hypot(boid.position.x - x, boid.position.y - y) < radius:
+                        found.append(boid)
+        return found
+
+    def neighbours(self, boid):
+        if boid not in self.cache:
+            self.cache[boid] = self.query(boid.position, self.radius, exclude=boid)
+        return self.cache[boid]
+
+    def depth(self, node=None):
+        node = node if node is not None else self.root
+        if node.children is None:
+            return 0
+        return 1 + max(self.depth(child) for child in node.children)
@@ -1,12 +1,37 @@
 import pygame
 import random
 import math
+import time
 import concurrent.futures
-
-dt = 1
-
-# Screen dimensions
+import queue
+import multiprocessing
+import numpy as np
+
+from sleeping import SleepSet
+from multirate import MultiRate, stride_limits
+from integrator import AdaptiveStep, pair_gaps
+from kdtree import KNearestIndex
+from neighbour_search import AutoIndex, create_backend
+from neighbour_graph import NeighbourGraph
+import periodic
+import capping
+from snapshots import Snapshot, SnapshotBuffer, FixedStepLoop, interpolate
+from frame_ring import FrameRing
+from dirty_render import DirtyRenderer, line_rect
+from world import ChunkedWorld, Camera
+
+dt = 1                  # length of the current step, chosen by step() when adaptive_step is on
+tick_time = 1           # simulated time per tick in the lockstep, thread and process modes
+adaptive_step = False   # pick dt each step from neighbour gaps, POI arrivals and world edges (overshoot at most one tick at max_speed), sub-stepping ticks as needed
+dt_min, dt_max = 0.125, 4   # bounds on the adaptive step
+step_approach = 0.25    # a step may close at most this fraction of a neighbour gap or arrival distance
+step_growth = 2         # the adaptive step grows by at most this factor per step
+
+# World dimensions, may be much larger than the window
 width, height = 1200, 700
+screen_width, screen_height = 1200, 700     # window
+chunk_size = 400        # side of the world chunks that hold boids and POIs, None for flat lists
+world_wrap = False      # toroidal world: boids wrap at the edges and see each other across the seams
 
 # Boid properties
 num_boids = 6           # adjust number of boids
@@ -14,7 +39,15 @@ max_rank = 7            # default rank
 min_speed = 3           # set minimum movement for swarming
 max_speed = 4           # physical speed limit
 max_force = 3        # maximum acceleration due to al, coh, sep
+capping_strategy = "exact"  # "exact" projection, "closest" nearest candidate, "sequential" first feasible in priority order
 perception_radius = 200
+perception_mode = "metric"  # "metric": everyone within perception_radius, "topological": k nearest within it
+perception_k = 7            # neighbours per boid in topological mode
+neighbour_backend = "auto"      # metric search: "brute" distance matrix, "grid" Verlet lists, "tree" loose quadtree, "auto" fastest of the three, None scans all boids
+verlet_skin = 40        # extra radius for the cached Verlet neighbour lists
+sleep_frozen = True     # skip behaviour for boids frozen at a POI until something changes around them
+multirate_stride = None # e.g. 8: longest stride (in ticks) between behaviour updates of idle boids, None updates every boid every tick
+multirate_error = 2.0   # position error (pixels) the idle strides may build up per stride
 safe_distance = 150     # distance which separation starts to be applied
 danger_distance = 50
 
@@ -28,6 +61,27 @@ weight_target = 6
 # Point of Interest properties
 POI_radius = 30
 
+# Display
+render_mode = "thread"  # "lockstep" one step per frame, "thread" fixed-step simulation thread, "process" viewer process over shared memory, "headless" no window
+headless_time = 3000    # simulated time a headless run covers
+headless_POIs = 3       # random POIs placed at the start of a headless run
+sim_rate = 30           # simulation steps per second unless lockstep
+frame_rate = 60         # drawn frames per second
+dirty_rendering = True  # thread/process modes: cached POI layer, redraw and update only around what moved
+ring_POIs = 4096        # process mode: POIs each shared-memory frame can carry
+
+# Shared neighbour search for the current tick, set up in main()
+neighbour_index = None
+neighbour_graph = None      # who is near whom this tick, rebuilt at the start of step()
+closest_field = None        # per graph row: distance to the nearest neighbour, inf when alone
+min_speed_field = None      # per graph row: speed floor from closest_field
+world = None                # ChunkedWorld when chunk_size is set
+multirate = None            # MultiRate when multirate_stride is set
+integrator = None           # AdaptiveStep when adaptive_step is set
+
+def world_period():     # period for minimum-image distances, None in a bounded world
+    return (width, height) if world_wrap else None
+
 # Colors
 white = (255, 255, 255)
 red = (255, 0, 0)
@@ -36,6 +90,9 @@ green = (0, 255, 0)
 pink = (255, 100, 100)
 
 class Boid:
+    # Fixed attribute set, no per-instance __dict__
+    __slots__ = ("position", "velocity", "acceleration", "angle", "mode", "rank", "connected", "label", "target", "min_speed", "stride")
+
     def __init__(self, label):
         self.position = pygame.math.Vector2(random.uniform(0, width), random.uniform(0, height))    # randomize starting position
         self.velocity = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))           # randomize velocity, scale to max_speed
@@ -48,51 +105,35 @@ class Boid:
         self.label = label
         self.target = None
         self.min_speed = min_speed
-
-    def set_min_speed(self, closest):
-        if closest <= danger_distance:
-            return 0
-        elif closest <= safe_distance:
-            m = min_speed / (safe_distance - danger_distance)
-            c = - m * danger_distance
-            return m * closest + c
-        else:
-            return min_speed
-
-    def get_closest_neighbour(self, neighbours):
-        closest = float('inf')
-        for neighbour in neighbours:
-            distance = self.position.distance_to(neighbour.position)
-            if distance < closest:
-                closest = distance
-        return closest
+        self.stride = 1         # ticks covered by one behaviour update
 
     def apply_behavior(self, boids, POIs):          # Executed in "parallel" with other boids
         neighbours = self.get_neighbours(boids)
-        d_closest = self.get_closest_neighbour(neighbours)
-        self.min_speed = self.set_min_speed(d_closest)
+        self.min_speed = min_speed_field[neighbour_graph.row[self]]     # worked out for the whole swarm in step()
 
         # Acceleration by al, col, sep, edges
-        n_acceleration = pygame.math.Vector2(0, 0)  
         al = (self.align(neighbours))
         coh = (self.cohesion(neighbours))
-        sep, weight_sep = self.separation(neighbours)
+        sep, weight_sep = self.separation(neighbours, neighbour_graph.neighbour_distances(self))
         sep = (sep)
-        edge = (self.avoid_edges())
-        n_acceleration = weight_al * al + weight_coh * coh + weight_sep * 2 * sep + weight_edge * edge
+        edge = (self.avoid_edges()) if not world_wrap else None
+        n_acceleration = pygame.math.Vector2(
+            weight_al * al.x + weight_coh * coh.x + weight_sep * 2 * sep.x + (weight_edge * edge.x if edge is not None else 0),
+            weight_al * al.y + weight_coh * coh.y + weight_sep * 2 * sep.y + (weight_edge * edge.y if edge is not None else 0))
         
         # Acceleration by target, weighted average
-        self.target = self.get_target(POIs)
+        self.target = self.get_target(world.pois_near(self.position, perception_radius) if world is not None else POIs)
         if self.target != None:
             self.mode = 1
             tar = (self.follow_target(self.target))
-            n_acceleration += weight_target * tar
+            n_acceleration.x += weight_target * tar.x
+            n_acceleration.y += weight_target * tar.y
             n_acceleration /= (weight_al + weight_coh + weight_sep + weight_edge + weight_target)
         else:
             n_acceleration /= (weight_al + weight_coh + weight_sep + weight_edge)
         
         # Capping
-        n_acceleration_cap, modi, possible = self.capping(n_acceleration)
+        n_acceleration_cap, modi = self.capping(n_acceleration)
 
         # Rank
         leader_connected = self.check_leader(boids)         # returns True or False, checks if leader is in the network
@@ -114,135 +155,55 @@ class Boid:
         # Return next acceleration and rank
         return n_rank, n_acceleration_cap
    
-    def check_cond(self, centre, acc):              # Check if all 3 conditions are fulfiled
-        eps = 1e-5
-        if acc.length() <= max_force + eps and acc.distance_to(centre) <= max_speed/dt + eps and acc.distance_to(centre) >= self.min_speed/dt - eps:
-            return True
-
-    def capping(self, acc):
-        capped_acc = None
-        modi = None
-        centre = -self.velocity/dt
-        possible = []
-        # Original
-        possible.append([acc, "ORIGNL"])
-        # Scaled
-        if acc.length() > 0:
-            scaled_acc = acc / acc.length() * max_force
-            possible.append([scaled_acc, "SCALED"])
-        #Projections
-        if acc != centre:
-            a, b = self.intersection_line_circle(centre=centre, radius=self.min_speed, point=acc)
-            c, d = self.intersection_line_circle(centre=centre, radius=max_speed, point=acc)
-            points = [a, b, c, d]
-            for point in points:
-                if point != None:
-                    possible.append([point, "PROJEC"])
-        # Intersections
-        a, b = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=max_speed)
-        c, d = self.intersection_vertices(centre_a=pygame.math.Vector2(0,0), radius_a=max_force, centre_b=centre, radius_b=self.min_speed)
-        points = [a, b, c, d]
-        for point in points:
-            if point != None:
-                possible.append([point, "INTSCT"])
-        
-        # Check all possibilities
-        closest_distance = float('inf')
-        for possibility in possible:
-            distance = acc.distance_to(possibility[0])
-            if distance < closest_distance and self.check_cond(centre, possibility[0]) == True:
-                closest_distance = distance
-                capped_acc = possibility[0]
-                modi = possibility[1]
-
-        return capped_acc, modi, possible
-
-    def intersection_line_circle(self, centre, radius, point):
-        direction = (point-centre).normalize()
-        intersection_1 = centre + direction * radius
-        intersection_2 = centre - direction * radius
-        return intersection_1, intersection_2
-
-    def intersection_vertices(self, centre_a, radius_a, centre_b, radius_b):
-        d = centre_a.distance_to(centre_b)
-        if d > radius_a + radius_b:             # Circles dont intersect
-            return None, None
-        elif d < abs(radius_a - radius_b):      # One circle is contained within the other
-            return None, None
-        elif d == 0 and radius_a == radius_b:   # The circles are identical and overlap completely.")
-            return None, None
-        
-        # Point P where the line through the intersection points crosses the line between centers
-        a = (radius_a**2 - radius_b**2 + d**2) / (2 * d)
-        P = centre_a + a * (centre_b - centre_a).normalize()
-        
-        # Distance from point P to the intersection points
-        h = math.sqrt(radius_a**2 - a**2)
-        
-        # Offset vector perpendicular to the line between centers
-        offset = (centre_b - centre_a).normalize().rotate(90) * h
-        
-        # Intersection points in Vector2 format
-        intersection_1 = P + offset
-        intersection_2 = P - offset
+    def horizon(self):                              # time the next acceleration is held for
+        return dt * self.stride
 
-        return intersection_1, intersection_2    
+    def capping(self, acc):                         # nearest acceleration within max_force, min_speed and max_speed
+        (x, y), code = capping.cap(capping_strategy, acc.x, acc.y, self.velocity.x, self.velocity.y, self.min_speed, max_speed, max_force, self.horizon())
+        return pygame.math.Vector2(x, y), capping.codes[code]
 
     def update(self, n_rank, n_acceleration):
         # update attributes from the previously computed values
         self.rank = n_rank
         self.acceleration = n_acceleration
-        # self.acceleration = self.cap(n_acceleration)
         # freeze if arrived
         if self.mode == 2:      
             self.freeze()
         # update angle, and bound & apply kinematics
         else:
             self.get_angle()
-            self.position += self.velocity * dt + 0.5 * self.acceleration * dt**2
-            self.velocity += self.acceleration * dt
-
-    def show_perception(self, neighbours, screen):  # Draws lines to neighbours
-        for neighbour in neighbours:
-            if self.position.distance_to(neighbour.position) < perception_radius:
-                pygame.draw.line(screen, red, self.position, neighbour.position, 2)
+            velocity, acceleration = self.velocity, self.acceleration
+            self.position.x += velocity.x * dt + 0.5 * acceleration.x * dt**2
+            self.position.y += velocity.y * dt + 0.5 * acceleration.y * dt**2
+            velocity.x += acceleration.x * dt
+            velocity.y += acceleration.y * dt
+            if world_wrap:
+                self.wraparound()
+
+    def show_perception(self, boids, screen):       # Draws lines to neighbours
+        for neighbour in self.get_neighbours(boids):
+            pygame.draw.line(screen, red, self.position, self.image_of(neighbour.position), 2)
 
     def check_done(self, neighbours):
         if self.mode == 2:
             count = 1
             for neighbour in neighbours:
-                if (neighbour.position - self.target.position).length() <= POI_radius and neighbour.mode == 2:
+                if periodic.distance(neighbour.position, self.target.position, world_period()) <= POI_radius and neighbour.mode == 2:
                     count += 1
             if count >= 3:
                 self.target = None
 
     def freeze(self):
         # freeze when arrived
-        self.velocity = pygame.math.Vector2(0, 0)
-        self.acceleration = pygame.math.Vector2(0, 0)
+        self.velocity.update(0, 0)
+        self.acceleration.update(0, 0)
 
     def get_angle(self): 
         # get angle before stop
-        if self.velocity.length != 0:
-                self.angle = self.velocity.angle_to(pygame.math.Vector2(1, 0))
+        self.angle = -math.degrees(math.atan2(self.velocity.y, self.velocity.x))    # angle_to((1, 0)); 0 when standing still
 
     def check_leader(self, boids):                  # Search if leader is in network
-        visited = set()                                 # Use a set to avoid duplicates
-
-        # Recursive DFS function
-        def dfs(boid):
-            if boid.rank == 0:                          # If the boid is a leader
-                return True
-            visited.add(boid)                           # Mark the current boid as visited
-            neighbours = boid.get_neighbours(boids)     # Get the neighbours of the current boid
-            for neighbour in neighbours:
-                if neighbour not in visited:            # Only visit unvisited neighbours
-                    if dfs(neighbour):                  # Recur for the neighbours
-                        return True
-            return False
-
-        # Start the DFS from the current boid
-        return dfs(self)
+        return neighbour_graph.reaches_leader(self)     # connectivity is worked out once per tick
 
     def ranking(self, neighbours, target):
         n_rank = self.rank
@@ -258,33 +219,14 @@ class Boid:
         return n_rank
 
     def show(self, screen, font):
-        # Draw leader as green
-        if self.rank == 0:
-            pygame.draw.circle(screen, green, self.position, 3)
-            # pygame.draw.polygon(screen, green, [
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle)), -math.sin(math.radians(self.angle))) * 10,
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle + 160)), -math.sin(math.radians(self.angle + 160))) * 10,
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle - 160)), -math.sin(math.radians(self.angle - 160))) * 10,
-            # ])
-        # Draw followers as white
-        else:
-            pygame.draw.circle(screen, white, self.position, 3)
-            # pygame.draw.polygon(screen, white, [
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle)), -math.sin(math.radians(self.angle))) * 10,
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle + 160)), -math.sin(math.radians(self.angle + 160))) * 10,
-            #     self.position + pygame.math.Vector2(math.cos(math.radians(self.angle - 160)), -math.sin(math.radians(self.angle - 160))) * 10,
-            # ])
-
-        # Print rank on screen
-        info_text = font.render(f"{self.label} {self.rank}", True, white)
-        screen.blit(info_text, (self.position.x + 15, self.position.y - 10))
-    
+        draw_boid(screen, font, self.position.x, self.position.y, self.rank, self.label)
+
     def get_target(self, POIs):
         target = None
         closest = perception_radius + 1
         self.mode = 0
         for poi in POIs:
-            distance = self.position.distance_to(poi.position)
+            distance = self.distance_to(poi.position)
             if distance < perception_radius:
                 if distance < closest:          # replace current poi with closer poi
                     closest = distance
@@ -292,122 +234,140 @@ class Boid:
         return target
 
     def follow_target(self, target):
-        steering = pygame.math.Vector2(0, 0)
-        if target != None:
-            distance = self.position.distance_to(target.position)
-            if distance <= POI_radius:
-                self.mode = 2                                           # freeze
-            steering = target.position - self.position                  # Delta p
-            steering = 2 * (steering - self.velocity * dt) / dt**2      # acceleration required to achieve Deltap
-        return steering
+        if target == None:
+            return pygame.math.Vector2(0, 0)
+        dx, dy = self.offset_xy(target.position)                         # Delta p
+        if math.hypot(dx, dy) <= POI_radius:
+            self.mode = 2                                               # freeze
+        h = self.horizon()
+        return pygame.math.Vector2(2 * (dx - self.velocity.x * h) / h**2,       # acceleration required to achieve Deltap
+                                   2 * (dy - self.velocity.y * h) / h**2)
 
     def get_neighbours(self, boids):
-        neighbours = []
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                neighbours.append(boid)
-        return neighbours                   # returns a list of boids that are within perception_radius
+        return neighbour_graph.neighbours(self)     # boids within perception_radius, from this tick's graph
 
     def align(self, neighbours):
-        steering = pygame.math.Vector2(0, 0)
+        sx = sy = 0.0                                                   # total velocity
         total = 0
         for neighbour in neighbours:
             if neighbour.rank < self.rank:
-                steering += neighbour.velocity * 2                              # total velocity
-                total += 1 * 2
+                w = 2
             elif neighbour.rank == self.rank:
-                steering += neighbour.velocity * 1                              # total velocity
-                total += 1 * 1
-            elif neighbour.rank > self.rank:
-                steering += neighbour.velocity * 0.5                              # total velocity
-                total += 1 * 0.5
+                w = 1
+            else:
+                w = 0.5
+            sx += neighbour.velocity.x * w
+            sy += neighbour.velocity.y * w
+            total += w
+        steering = pygame.math.Vector2(sx, sy)
         if total > 0:
-            steering = steering/total                                   # avg velocity
-            steering = (steering - self.velocity) / dt                  # acceleration needed to match avg velocity at next dt
+            steering /= total                                           # avg velocity
+            steering -= self.velocity
+            steering /= self.horizon()                                  # acceleration needed to match avg velocity at next update
         return steering
 
     def cohesion(self, neighbours):
-        steering = pygame.math.Vector2(0, 0)
+        sx = sy = 0.0                                                   # total position
         total = 0
         for neighbour in neighbours:
             if neighbour.rank < self.rank:
-                steering += neighbour.position * 2                              # total position
-                total += 1 * 2
+                w = 2
             elif neighbour.rank == self.rank:
-                steering += neighbour.position * 1                              # total position
-                total += 1 * 1
-            elif neighbour.rank > self.rank:
-                steering += neighbour.position * 0.5                              # total position
-                total += 1 * 0.5
+                w = 1
+            else:
+                w = 0.5
+            dx, dy = self.offset_xy(neighbour.position)
+            sx += (self.position.x + dx) * w
+            sy += (self.position.y + dy) * w
+            total += w
+        steering = pygame.math.Vector2(sx, sy)
         if total > 0:
             steering /= total                                           # avg position
-            target_pos = steering
-            rel_target_pos = target_pos - self.position                                   # Delta p
-            steering = 2 * (rel_target_pos - self.velocity * dt) / dt**2      # acceleration needed to arrive at centre of mass at next dt
-        
+            steering -= self.position                                   # Delta p
+            h = self.horizon()
+            steering.x = 2 * (steering.x - self.velocity.x * h) / h**2        # acceleration needed to arrive at centre of mass at next update
+            steering.y = 2 * (steering.y - self.velocity.y * h) / h**2
         return steering
 
-    def separation(self, neighbours):
-        steering = pygame.math.Vector2(0, 0)
+    def separation(self, neighbours, distances):          # distances: the matching neighbour distances
+        gx = gy = 0.0
         total = 0
         closest = safe_distance + 1
-        for neighbour in neighbours:
-            distance = self.position.distance_to(neighbour.position)
-            if distance < safe_distance:
+        for k, neighbour in enumerate(neighbours):
+            dx, dy = self.offset_xy(neighbour.position)
+            distance = distances[k]
+            if distance < safe_distance and distance > 0:
                 if distance < closest:
                     closest = distance
-                away_v = -(neighbour.position - self.position)          # vector pointing away
-                away_v.scale_to_length(safe_distance)                   # scaled vector to match safe_dist
-                goal_p = neighbour.position + away_v                    # goal position w.r.t. one particular neighbour
-                steering += goal_p                                      
+                # goal position w.r.t. one particular neighbour: safe_distance away from it, on our side
+                gx += dx - dx / distance * safe_distance
+                gy += dy - dy / distance * safe_distance
                 total += 1
+        steering = pygame.math.Vector2(0, 0)
         if total > 0:
-            steering /= total                                           # avg goal position
-            steering -= self.position                                   # Delta p
-            steering = 2 * (steering - self.velocity * dt) / dt**2      # acceleration needed to arrive at centre of mass at next dt
-        if steering.length() == 0:
+            gx /= total                                                 # avg goal position, relative to self (Delta p)
+            gy /= total
+            h = self.horizon()
+            steering.update(2 * (gx - self.velocity.x * h) / h**2,     # acceleration needed to arrive at centre of mass at next update
+                            2 * (gy - self.velocity.y * h) / h**2)
+        if steering.x == 0 and steering.y == 0:
             weight_sep = 0
         else:
             weight_sep = (safe_distance - closest) / safe_distance
         return steering, weight_sep
 
     def avoid_edges(self):
-        steering = pygame.math.Vector2(0, 0)
+        sx = sy = 0.0
         buffer = perception_radius  # Distance from edge to start avoiding
         
+        # Bounce only while still heading out, so a boid that is past the edge after a short step is not sent back out
         if self.position.x < buffer:
-            steering += pygame.math.Vector2(max_speed, 0)
-            if self.position.x <= 0:
+            sx += max_speed
+            if self.position.x <= 0 and self.velocity.x < 0:
                 self.velocity.x *= -1  # Bounce
         elif self.position.x > width - buffer:
-            steering += pygame.math.Vector2(-max_speed, 0)
-            if self.position.x >= width:
+            sx -= max_speed
+            if self.position.x >= width and self.velocity.x > 0:
                 self.velocity.x *= -1  # Bounce
 
         if self.position.y < buffer:
-            steering += pygame.math.Vector2(0, max_speed)
-            if self.position.y <= 0:
+            sy += max_speed
+            if self.position.y <= 0 and self.velocity.y < 0:
                 self.velocity.y *= -1  # Bounce
         elif self.position.y > height - buffer:
-            steering += pygame.math.Vector2(0, -max_speed)
-            if self.position.y >= height:
+            sy -= max_speed
+            if self.position.y >= height and self.velocity.y > 0:
                 self.velocity.y *= -1  # Bounce
 
-        if steering.length() > 0:
-            steering.scale_to_length(max_speed)
-            steering -= self.velocity
-        return steering
+        length = math.hypot(sx, sy)
+        if length > 0:
+            sx = sx / length * max_speed - self.velocity.x
+            sy = sy / length * max_speed - self.velocity.y
+        return pygame.math.Vector2(sx, sy)
     
     def wraparound(self):
-        if self.position.x < 0:
-            self.position.x = (width + (self.position.x % width))
-        if self.position.x >= width:
+        if self.position.x < 0 or self.position.x >= width:
             self.position.x %= width
-        if self.position.y < 0:
-            self.position.y = (height + (self.position.y % height))
-        if self.position.y >= height:
+        if self.position.y < 0 or self.position.y >= height:
             self.position.y %= height
 
+    def offset_to(self, position):          # vector to position, across the seams in a toroidal world
+        return periodic.offset(self.position, position, world_period())
+
+    def distance_to(self, position):
+        return periodic.distance(self.position, position, world_period())
+
+    def offset_xy(self, position):          # offset_to as plain floats
+        dx, dy = position.x - self.position.x, position.y - self.position.y
+        if world_wrap:
+            dx, dy = periodic.min_image(dx, width), periodic.min_image(dy, height)
+        return dx, dy
+
+    def image_of(self, position):           # the copy of position nearest to this boid
+        if not world_wrap:
+            return position
+        return self.position + self.offset_to(position)
+
     def bounce(self):
         if self.position.x <= 0 or self.position.x >= width:
             self.velocity.x *= -1  # Bounce
@@ -415,33 +375,215 @@ class Boid:
             self.velocity.x *= -1  # Bounce
 
 class POI:
+    __slots__ = ("position", "count")
+
     def __init__(self, x, y):
         self.position = pygame.math.Vector2(x,y)
         self.count = 0
     
     def show(self, screen):
-        pygame.draw.circle(screen, pink, (self.position.x, self.position.y), POI_radius)
-        pygame.draw.circle(screen, red, (self.position.x, self.position.y), 10)
+        draw_poi(screen, self.position.x, self.position.y)
 
     def update(self, boids, POIs, screen):  # remove self if task is completed
         self.count = 0
+        if world is not None:
+            boids = world.boids_near(self.position, perception_radius)
         for boid in boids:
-            distance = self.position.distance_to(boid.position)
+            distance = periodic.distance(self.position, boid.position, world_period())
             if distance < perception_radius:
                 # pygame.draw.line(screen, pink, self.position, boid.position, 2)
                 if distance < POI_radius:
                     self.count += 1
                     if self.count == 3:
                         POIs.remove(self)
-
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((width, height))
-    clock = pygame.time.Clock()
-
-    boids = [Boid(chr(65 + i)) for i in range(num_boids)]
-    POIs = []
-
+                        if world is not None:
+                            world.remove_poi(self)
+
+def add_poi(POIs, x, y):
+    poi = POI(x, y)
+    POIs.append(poi)
+    if world is not None:
+        world.add_poi(poi)
+
+def create_neighbour_index():
+    if perception_mode == "topological":
+        return KNearestIndex(perception_k, perception_radius, world_period())
+    if neighbour_backend == "auto":
+        return AutoIndex(perception_radius, (0, 0, width, height), world_period(), verlet_skin)
+    if neighbour_backend is not None:
+        return create_backend(neighbour_backend, perception_radius, (0, 0, width, height), world_period(), verlet_skin)
+    return None
+
+def speed_floor(closest):   # min_speed per closest-neighbour distance: 0 up to danger_distance, rising linearly to min_speed at safe_distance
+    return (np.clip((closest - danger_distance) / (safe_distance - danger_distance), 0, 1) * min_speed).tolist()
+
+def idle_strides(boids, POIs, everyone):     # stride limit per boid, 1 for those that need every tick
+    positions = np.array([(boid.position.x, boid.position.y) for boid in boids], dtype=float).reshape(-1, 2)
+    leaders = [(boid.position.x, boid.position.y) for boid in everyone if boid.rank == 0]
+    closest = [closest_field[neighbour_graph.row[boid]] for boid in boids]
+    limits = stride_limits(positions, [(poi.position.x, poi.position.y) for poi in POIs], leaders, closest,
+                           perception_radius, max_speed, dt, multirate_stride, danger_distance, world_period(),
+                           None if world_wrap else (width, height))     # edge bounces only run in apply_behavior
+    return [1 if boid.target is not None or boid.mode != 0 or neighbour_graph.reaches_leader(boid) else limit
+            for boid, limit in zip(boids, limits)]
+
+def choose_dt(boids, left):     # adaptive step from this tick's graph, at most `left` (but see AdaptiveStep.choose)
+    positions = np.array([(boid.position.x, boid.position.y) for boid in boids], dtype=float).reshape(-1, 2)
+    velocities = np.array([(boid.velocity.x, boid.velocity.y) for boid in boids], dtype=float).reshape(-1, 2)
+    moving = np.array([boid.mode != 2 for boid in boids], dtype=bool)
+    arrivals = []                   # (distance left to the arrival circle, speed towards the POI)
+    for boid in boids:
+        if boid.mode == 1 and boid.target is not None:
+            dx, dy = boid.offset_xy(boid.target.position)
+            distance = math.hypot(dx, dy)
+            closing = (dx * boid.velocity.x + dy * boid.velocity.y) / distance if distance > 0 else 0
+            arrivals.append((distance - POI_radius, closing))
+    edges = None
+    if not world_wrap:              # distance to the edge each boid is heading for, along x and along y
+        ahead, speed = [], []
+        for axis, size in ((0, width), (1, height)):
+            p, v = positions[moving, axis], velocities[moving, axis]
+            gap = np.where(v > 0, size - p, p)
+            inside = gap > 0        # boids already past it bounce in this step's behaviour
+            ahead.append(gap[inside])
+            speed.append(np.abs(v[inside]))
+        edges = np.concatenate(ahead), np.concatenate(speed)
+    return integrator.choose(pair_gaps(neighbour_graph, positions, velocities, moving, world_period()),
+                             np.array(arrivals, dtype=float).reshape(-1, 2).T, left, edges)
+
+def step(boids, POIs, sleepers=None, left=math.inf):
+    # One step of length dt, returned; with adaptive_step dt is chosen here and kept within `left`
+    global neighbour_graph, closest_field, min_speed_field, dt
+    if neighbour_index is not None:
+        neighbour_index.update(boids)               # grid: rebuilds past half the skin, tree: splits/merges, k-NN: new KD-tree, auto: may recalibrate
+    neighbour_graph = NeighbourGraph(boids, perception_radius, neighbour_index, world_period())
+    closest_field = neighbour_graph.closest
+    if integrator is not None:
+        dt = choose_dt(boids, left)
+    min_speed_field = speed_floor(closest_field)
+
+    # Sleeping boids keep their neighbour index entries but skip behaviour and update
+    active = boids
+    if sleepers is not None:
+        sleepers.settle(boids)                      # boids frozen last tick, against this tick's graph
+        sleepers.wake(boids, POIs)
+        active = sleepers.awake(boids)
+
+    # Idle boids far from POIs and leaders coast on their last acceleration between behaviour updates
+    coasting = []
+    if multirate is not None:
+        active, coasting = multirate.split(active, idle_strides(active, POIs, boids), dt)
+
+    # Use ThreadPoolExecutor to update each boid in parallel
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        # Apply behaviors and update boids concurrently
+        futures = [executor.submit(boid.apply_behavior, boids, POIs) for boid in active]
+        concurrent.futures.wait(futures)  # Wait for all boids to complete calculation
+
+        new_values = [future.result() for future in futures]
+        for boid, (n_rank, n_acceleration) in zip(active, new_values):
+            boid.update(n_rank, n_acceleration)
+            if multirate is not None:
+                multirate.sampled(boid, n_acceleration, dt)
+    for boid in coasting:
+        boid.update(boid.rank, boid.acceleration)
+
+    if world is not None:
+        world.update(boids)                         # boids that crossed a chunk border change lists
+    return dt
+
+def advance_by(boids, POIs, sleepers, duration):   # steps until `duration` simulated time has passed
+    left = duration
+    while left > 1e-9:
+        left -= step(boids, POIs, sleepers, left)
+
+def report_tick(ts):     # per-tick swarm spacing, from the last step's graph
+    print(f"Time Step: {ts}, closest pair: {closest_field.min(initial=math.inf):.1f}, within danger_distance: {int((closest_field <= danger_distance).sum())}")
+
+def draw_boid(screen, font, x, y, rank, label):
+    # Draw leader as green, followers as white
+    pygame.draw.circle(screen, green if rank == 0 else white, (x, y), 3)
+    # Print rank on screen
+    info_text = font.render(f"{label} {rank}", True, white)
+    screen.blit(info_text, (x + 15, y - 10))
+
+def boid_rect(font, x, y, rank, label):    # bounds of draw_boid
+    w, h = font.size(f"{label} {rank}")
+    return pygame.Rect(int(x) - 4, int(y) - 4, 9, 9).union(pygame.Rect(int(x) + 15, int(y) - 10, w + 1, h + 1))
+
+def draw_poi(screen, x, y, zoom=1):
+    pygame.draw.circle(screen, pink, (x, y), max(POI_radius * zoom, 1))
+    pygame.draw.circle(screen, red, (x, y), max(10 * zoom, 1))
+
+def draw_pois(screen, spots, zoom=1):
+    for x, y in spots:
+        draw_poi(screen, x, y, zoom)
+
+def capture(boids, POIs, tick):     # immutable copy of what the renderer needs
+    edges = []
+    if neighbour_graph is not None:                 # graph rows follow the boids list
+        offsets, indices = neighbour_graph.offset_list, neighbour_graph.index_list
+        edges = [indices[offsets[i]:offsets[i + 1]] for i in range(len(boids))]
+    chunks = None
+    if world is not None:
+        boid_row = {boid: i for i, boid in enumerate(boids)}
+        poi_row = {poi: k for k, poi in enumerate(POIs)}
+        chunks = {key: ([boid_row[boid] for boid in chunk.boids], [poi_row[poi] for poi in chunk.POIs])
+                  for key, chunk in world.chunks.items() if chunk.boids or chunk.POIs}
+    return Snapshot(time.perf_counter(), tick,
+                    [(boid.position.x, boid.position.y, boid.angle, boid.rank, boid.label) for boid in boids],
+                    edges, [(poi.position.x, poi.position.y) for poi in POIs], chunks)
+
+def draw_snapshots(screen, font, previous, latest, renderer=None, camera=None, grid=None):
+    # Draw one step behind the simulation, blending towards the latest snapshot, and show it.
+    # With a camera over a chunked snapshot only the chunks in view are looked at;
+    # grid is the ChunkedWorld the chunk keys belong to, the simulation's world by default.
+    alpha = min(max((time.perf_counter() - latest.time) * sim_rate, 0.0), 1.0)
+    grid = grid if grid is not None else world
+    rows = poi_rows = None
+    if camera is not None and latest.chunks is not None:
+        keys = [key for key in grid.keys_in(*camera.view()) if key in latest.chunks]
+        rows = sorted(i for key in keys for i in latest.chunks[key][0])
+        poi_rows = sorted(k for key in keys for k in latest.chunks[key][1])
+    rows = range(len(latest.boids)) if rows is None else rows
+    drawn = dict(zip(rows, interpolate(previous, latest, alpha, world_period(), rows)))
+    POIs = latest.POIs if poi_rows is None else [latest.POIs[k] for k in poi_rows]
+    to_screen = camera.to_screen if camera is not None else (lambda x, y: (x, y))
+    zoom = camera.zoom if camera is not None else 1
+
+    lines = []
+    for i in (rows if latest.edges else ()):
+        x0, y0 = drawn[i][:2]
+        for j in latest.edges[i]:
+            x1, y1 = drawn[j][:2] if j in drawn else latest.boids[j][:2]
+            if world_wrap:          # towards the nearest image
+                x1 = x0 + periodic.min_image(x1 - x0, width)
+                y1 = y0 + periodic.min_image(y1 - y0, height)
+            lines.append((i, j, to_screen(x0, y0), to_screen(x1, y1)))
+    shown = [(i, *to_screen(x, y), rank, label) for i, (x, y, angle, rank, label) in drawn.items()]
+    spots = [to_screen(x, y) for x, y in POIs]
+
+    if renderer is None:
+        screen.fill(black)
+        for x, y in spots:
+            draw_poi(screen, x, y, zoom)
+        for _, _, start, end in lines:
+            pygame.draw.line(screen, red, start, end, 2)
+        for _, x, y, rank, label in shown:
+            draw_boid(screen, font, x, y, rank, label)
+        pygame.display.flip()
+        return
+
+    renderer.set_static((tuple(spots), zoom), lambda surface: draw_pois(surface, spots, zoom))
+    items = [(("edge", i, j), (start, end), line_rect(start, end, 2),
+              lambda surface, start=start, end=end: pygame.draw.line(surface, red, start, end, 2))
+             for i, j, start, end in lines]
+    items += [(("boid", i), (x, y, rank, label), boid_rect(font, x, y, rank, label),
+               lambda surface, x=x, y=y, rank=rank, label=label: draw_boid(surface, font, x, y, rank, label))
+              for i, x, y, rank, label in shown]
+    renderer.render(items)
+
+def run_lockstep(screen, clock, boids, POIs, sleepers):
     ts = 0  # Time step
 
     running = True
@@ -456,35 +598,163 @@ def main():
         # Create POI at mouse click
         if mouse[0] == 1:
             x, y = pygame.mouse.get_pos()
-            POIs.append(POI(x, y))
+            add_poi(POIs, x, y)
         
         # Draw POI
         for poi in POIs:
             poi.update(boids, POIs, screen)
             poi.show(screen)
 
-        # Use ThreadPoolExecutor to update each boid in parallel
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Apply behaviors and update boids concurrently
-            futures = [executor.submit(boid.apply_behavior, boids, POIs) for boid in boids]
-            concurrent.futures.wait(futures)  # Wait for all boids to complete calculation
-            
-            new_values = [future.result() for future in futures]
-            for boid, (n_rank, n_acceleration) in zip(boids, new_values):
-                boid.update(n_rank, n_acceleration)
+        advance_by(boids, POIs, sleepers, tick_time)
 
         # Draw boids
         for boid in boids:
             boid.show_perception(boids, screen)
             boid.show(screen, font=pygame.font.Font(None, 24))
 
-        print(f"Time Step: {ts}")
+        report_tick(ts)
         ts += 1
 
         pygame.display.flip()
         # Adjust to see in slow motion. Try 15 or 10
         clock.tick(30)
 
+def simulation_loop(boids, POIs, sleepers, clicks, buffer):
+    # FixedStepLoop that adds clicked POIs, steps and publishes a capture() to buffer
+    ts = 0  # Time step
+
+    def advance():
+        nonlocal ts
+        while True:
+            try:
+                add_poi(POIs, *clicks.get_nowait())
+            except queue.Empty:
+                break
+        for poi in list(POIs):
+            poi.update(boids, POIs, None)
+        advance_by(boids, POIs, sleepers, tick_time)
+        report_tick(ts)
+        ts += 1
+
+    buffer.publish(capture(boids, POIs, ts))
+    return FixedStepLoop(advance, lambda: capture(boids, POIs, ts), buffer, sim_rate)
+
+def run_threaded(screen, clock, boids, POIs, sleepers):
+    # The simulation thread owns boids and POIs; this thread only sends clicks and draws snapshots
+    clicks = queue.Queue()
+    buffer = SnapshotBuffer()
+    loop = simulation_loop(boids, POIs, sleepers, clicks, buffer)
+    loop.start()
+    font = pygame.font.Font(None, 24)
+    renderer = DirtyRenderer(screen, black) if dirty_rendering else None
+    camera = Camera((screen_width, screen_height))
+
+    running = True
+    while running and loop.error is None:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            camera.handle(event)
+
+        # Create POI at mouse click
+        if pygame.mouse.get_pressed()[0] == 1:
+            clicks.put(camera.to_world(*pygame.mouse.get_pos()))
+
+        draw_snapshots(screen, font, *buffer.read(), renderer, camera)
+        clock.tick(frame_rate)
+
+    loop.stop()                         # re-raises a failed simulation step here
+
+def view(ring_name, capacity, poi_capacity, labels, clicks):
+    # Viewer process: draws the newest frame of the ring, sends clicks back; perception lines are not shared.
+    # Frames carry no chunks, so the viewer sorts each new one into chunks of its own for culling.
+    ring = FrameRing(capacity, poi_capacity, name=ring_name)
+    grid = ChunkedWorld(width, height, chunk_size, world_period()) if chunk_size is not None else None
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    clock = pygame.time.Clock()
+    font = pygame.font.Font(None, 24)
+    renderer = DirtyRenderer(screen, black) if dirty_rendering else None
+    camera = Camera((screen_width, screen_height))
+    previous = latest = None
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            camera.handle(event)
+        if pygame.mouse.get_pressed()[0] == 1:
+            clicks.put(camera.to_world(*pygame.mouse.get_pos()))
+
+        frame = ring.latest(labels)
+        if frame is not None and (latest is None or frame.tick != latest.tick):
+            if grid is not None:
+                frame.chunks = grid.group(frame.boids, frame.POIs)
+            previous, latest = latest, frame
+        if latest is not None:
+            draw_snapshots(screen, font, previous, latest, renderer, camera, grid)
+        clock.tick(frame_rate)
+
+    ring.close_viewer()
+    ring.close()
+    pygame.quit()
+
+def run_process(boids, POIs, sleepers):
+    # This process simulates and writes frames; the viewer process reads whatever is newest
+    ring = FrameRing(len(boids), ring_POIs)
+    clicks = multiprocessing.Queue()
+    viewer = multiprocessing.Process(target=view, args=(ring.name, len(boids), ring_POIs, [boid.label for boid in boids], clicks), daemon=True)
+    viewer.start()
+    loop = simulation_loop(boids, POIs, sleepers, clicks, ring)
+    loop.start()
+    while viewer.is_alive() and not ring.closed and loop.error is None:
+        viewer.join(0.2)
+    try:
+        loop.stop()                     # re-raises a failed simulation step here
+    finally:
+        ring.close()
+
+def run_headless(boids, POIs, sleepers):
+    # No window: cover headless_time with as few (adaptive) steps as the swarm allows
+    for _ in range(headless_POIs):
+        add_poi(POIs, random.uniform(0, width), random.uniform(0, height))
+    start = time.perf_counter()
+    steps = 0
+    now = 0.0
+    while now < headless_time - 1e-9:
+        for poi in list(POIs):
+            poi.update(boids, POIs, None)
+        now += step(boids, POIs, sleepers, headless_time - now)
+        steps += 1
+    print(f"Simulated time {now:.0f} in {steps} steps, {time.perf_counter() - start:.1f}s, POIs left: {len(POIs)}")
+
+def main():
+    global neighbour_index, world, multirate, integrator
+    boids = [Boid(chr(65 + i)) for i in range(num_boids)]
+    POIs = []
+    neighbour_index = create_neighbour_index()
+    sleepers = SleepSet() if sleep_frozen else None
+    multirate = MultiRate(multirate_stride, multirate_error) if multirate_stride is not None else None
+    integrator = AdaptiveStep(max_force, dt_min, dt_max, step_approach, step_growth, max_speed * tick_time) if adaptive_step else None
+    if chunk_size is not None:
+        world = ChunkedWorld(width, height, chunk_size, world_period())
+        world.update(boids)
+
+    if render_mode == "process":
+        run_process(boids, POIs, sleepers)
+        return
+    if render_mode == "headless":
+        run_headless(boids, POIs, sleepers)
+        return
+
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    clock = pygame.time.Clock()
+    if render_mode == "thread":
+        run_threaded(screen, clock, boids, POIs, sleepers)
+    else:
+        run_lockstep(screen, clock, boids, POIs, sleepers)
 
     pygame.quit()
 
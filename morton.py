@@ -0,0 +1,27 @@
+import numpy as np
+
+# Z-order (Morton) codes of grid cells, used to sort agent rows so that boids
+# in nearby cells sit next to each other in memory
+
+
+def spread_bits(v):                     # 16-bit integers -> every other bit of 32
+    v = v.astype(np.uint64) & 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def cells(positions, cell_size, origin=None):
+    origin = positions.min(axis=0) if origin is None else np.asarray(origin, dtype=float)
+    return np.clip(np.floor((positions - origin) / cell_size), 0, 0xFFFF).astype(np.int64)
+
+
+def codes(cell):                        # (N, 2) non-negative cell coordinates -> Morton codes
+    return spread_bits(cell[:, 0]) | (spread_bits(cell[:, 1]) << 1)
+
+
+def order(positions, cell_size, origin=None):
+    # row permutation that sorts positions by the Morton code of their cell
+    return np.argsort(codes(cells(positions, cell_size, origin)), kind="stable")
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+import periodic
+
+# Multi-rate stepping for idle boids. A boid with nothing relevant around it
+# (no target, no leader in its network, no POI or leader near its perception
+# radius) only runs its behaviour every `stride` steps, capped for a step of
+# stride * dt. In between, update() carries on with the held acceleration,
+# which for constant acceleration is the same as one step of stride * dt.
+#
+# Two bounds keep this safe. First, the stride is short enough that no POI,
+# leader or neighbour can come within reach, and in a bounded world the boid
+# cannot get within the edge-avoidance buffer, before the next behaviour
+# update (distance margins). Second, it follows an error estimate: half the change in
+# acceleration between two updates times (stride * dt) squared. The stride
+# doubles while that estimate is under a quarter of `error` and halves when
+# it goes over. A boid whose margins run out goes back to full rate at once.
+#
+# Capped accelerations tend to flip from one edge of the feasible set to the
+# other on alternate ticks. That chatter cancels out in the positions, so the
+# estimate uses an exponential mean of the acceleration (weight `smoothing`)
+# rather than the raw samples.
+
+
+def stride_limits(positions, POIs, leaders, closest, radius, speed, dt, max_stride, danger=0, period=None, bounds=None):
+    # Largest stride per boid that the margins allow: a POI must stay beyond radius + the distance
+    # the boid covers, a leader or the closest neighbour beyond radius / danger + what both cover.
+    # With bounds (width, height) of a non-wrapping world, the edges must stay beyond radius too.
+    reach = speed * dt
+    limit = np.full(len(positions), float(max_stride))
+    for sources, gap, moving in ((POIs, radius, 1), (leaders, radius, 2)):
+        if len(sources):
+            diff = periodic.offset_arrays(np.asarray(sources, dtype=float)[None, :, :] - positions[:, None, :], period)
+            nearest = np.sqrt((diff ** 2).sum(axis=2)).min(axis=1)
+            limit = np.minimum(limit, (nearest - gap) / (moving * reach))
+    limit = np.minimum(limit, (np.asarray(closest, dtype=float) - danger) / (2 * reach))
+    if bounds is not None and len(positions):
+        edge = np.minimum(positions, np.asarray(bounds, dtype=float) - positions).min(axis=1)
+        limit = np.minimum(limit, (edge - radius) / reach)
+    return np.clip(np.floor(limit), 1, max_stride).astype(int).tolist()
+
+
+class MultiRate:
+    def __init__(self, max_stride=8, error=2.0, smoothing=0.25):
+        self.max_stride = max_stride
+        self.error = error              # tolerated position error per stride, in pixels
+        self.smoothing = smoothing
+        self.remaining = {}             # boid -> time left on its held acceleration
+        self.proposed = {}              # boid -> stride the error estimate allows next
+        self.mean = {}                  # boid -> smoothed acceleration over its behaviour updates
+
+    def split(self, boids, limits, dt=1):
+        # boids -> (due for behaviour now, coasting on held acceleration); sets boid.stride for the due ones.
+        # The held time is what the acceleration was capped for, so a boid stops coasting when the
+        # next step of length dt no longer fits in it, whatever dt did in the meantime.
+        due, coasting = [], []
+        for boid, limit in zip(boids, limits):
+            left = self.remaining.get(boid, 0)
+            if limit <= 1:
+                self.proposed[boid] = 1
+            elif dt <= left * (1 + 1e-9) and left <= limit * dt * (1 + 1e-9):
+                self.remaining[boid] = left - dt
+                coasting.append(boid)
+                continue
+            boid.stride = max(1, min(self.proposed.get(boid, 1), limit))
+            self.remaining[boid] = (boid.stride - 1) * dt
+            due.append(boid)
+        return due, coasting
+
+    def sampled(self, boid, acceleration, dt):     # after behaviour: error estimate -> next stride
+        last = self.mean.get(boid)
+        if last is None:
+            self.mean[boid] = (acceleration.x, acceleration.y)
+            return
+        w = self.smoothing
+        mean = self.mean[boid] = (last[0] + w * (acceleration.x - last[0]), last[1] + w * (acceleration.y - last[1]))
+        change = math.hypot(mean[0] - last[0], mean[1] - last[1])
+        estimate = 0.5 * change * (boid.stride * dt) ** 2
+        stride = boid.stride
+        if estimate > self.error:
+            stride = max(1, boid.stride // 2)
+        elif estimate < self.error / 4:
+            stride = min(self.max_stride, boid.stride * 2)
+        self.proposed[boid] = stride
@@ -0,0 +1,72 @@
+from collections import deque
+
+import numpy as np
+
+import periodic
+
+# Tick-level neighbour graph in CSR form. Row i lists the neighbours of boids[i]:
+# indices[offsets[i]:offsets[i + 1]] with the matching distances. Built once per
+# tick from the neighbour index (or a full scan), then shared by the behaviours,
+# ranking, leader connectivity and drawing.
+
+
+class NeighbourGraph:
+    def __init__(self, boids, radius, index=None, period=None):
+        self.boids = list(boids)
+        self.row = {boid: i for i, boid in enumerate(self.boids)}
+        offsets = [0]
+        indices = []
+        distances = []
+        for boid in self.boids:
+            found = index.neighbours(boid) if index is not None else [
+                other for other in self.boids
+                if other is not boid and periodic.distance(boid.position, other.position, period) < radius]
+            for other in found:
+                indices.append(self.row[other])
+                distances.append(periodic.distance(boid.position, other.position, period))
+            offsets.append(len(indices))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.distances = np.array(distances, dtype=float)
+        self.closest = np.full(len(self.boids), np.inf)          # nearest neighbour distance per row
+        nonempty = self.offsets[1:] > self.offsets[:-1]
+        if len(self.distances):
+            self.closest[nonempty] = np.minimum.reduceat(self.distances, self.offsets[:-1][nonempty])
+
+        # plain lists for the per-boid Python paths
+        self.offset_list = offsets
+        self.index_list = indices
+        self.distance_list = distances
+        self.lists = {}
+        self.leader_reach = self.connect_leaders()
+
+    def neighbours(self, boid):
+        i = self.row[boid]
+        if i not in self.lists:
+            self.lists[i] = [self.boids[j] for j in self.index_list[self.offset_list[i]:self.offset_list[i + 1]]]
+        return self.lists[i]
+
+    def neighbour_distances(self, boid):
+        i = self.row[boid]
+        return self.distance_list[self.offset_list[i]:self.offset_list[i + 1]]
+
+    def connect_leaders(self):
+        # Same answer as a DFS from each boid looking for a rank 0 boid, for every boid at once:
+        # walk the reversed edges out from all leaders
+        reverse = [[] for _ in self.boids]
+        for i in range(len(self.boids)):
+            for j in self.index_list[self.offset_list[i]:self.offset_list[i + 1]]:
+                reverse[j].append(i)
+        reach = [boid.rank == 0 for boid in self.boids]
+        queue = deque(i for i, leader in enumerate(reach) if leader)
+        while queue:
+            j = queue.popleft()
+            for i in reverse[j]:
+                if not reach[i]:
+                    reach[i] = True
+                    queue.append(i)
+        return reach
+
+    def reaches_leader(self, boid):
+        return self.leader_reach[self.row[boid]]
@@ -0,0 +1,103 @@
+import math
+import time
+
+import numpy as np
+
+import periodic
+from verlet import VerletList
+from loose_quadtree import LooseQuadtree
+
+# Pluggable neighbour search. Every backend has update(boids) once per tick and
+# neighbours(boid) afterwards, like the indices main.py already uses:
+#   "brute": NumPy distance matrix over all boids, cheapest for small swarms
+#   "grid":  Verlet lists over a uniform grid, for moderate density
+#   "tree":  adaptive loose quadtree, for clustered swarms
+# AutoIndex times the backends on the live swarm and keeps the fastest, and
+# calibrates again when N or the swarm density moves by more than `factor`.
+
+
+class BruteForceIndex:
+    def __init__(self, radius, period=None):
+        self.radius = radius
+        self.period = period
+        self.row = {}
+        self.rows = []
+
+    def update(self, boids):
+        boids = list(boids)
+        self.row = {boid: i for i, boid in enumerate(boids)}
+        points = np.array([(boid.position.x, boid.position.y) for boid in boids], dtype=float).reshape(-1, 2)
+        diff = periodic.offset_arrays(points[None, :, :] - points[:, None, :], self.period)
+        within = np.hypot(diff[..., 0], diff[..., 1]) < self.radius
+        np.fill_diagonal(within, False)
+        self.rows = [[boids[j] for j in np.flatnonzero(mask)] for mask in within]
+
+    def neighbours(self, boid):
+        return self.rows[self.row[boid]]
+
+
+def create_backend(name, radius, bounds, period=None, skin=40):
+    if name == "brute":
+        return BruteForceIndex(radius, period)
+    if name == "grid":
+        return VerletList(radius, skin, period)
+    if name == "tree":
+        return LooseQuadtree(radius, bounds, period=period)
+    raise ValueError(f"unknown neighbour search backend: {name}")
+
+
+def density(boids, radius):             # boids per unit area of the swarm's bounding box
+    xs = [boid.position.x for boid in boids]
+    ys = [boid.position.y for boid in boids]
+    if not xs:
+        return 0.0
+    area = max(max(xs) - min(xs), radius) * max(max(ys) - min(ys), radius)
+    return len(xs) / area
+
+
+def time_backend(backend, boids, trials=2):
+    # fresh update plus every query, best of `trials`
+    best = math.inf
+    for _ in range(trials):
+        start = time.perf_counter()
+        backend.update(boids)
+        for boid in boids:
+            backend.neighbours(boid)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class AutoIndex:
+    def __init__(self, radius, bounds, period=None, skin=40, backends=("brute", "grid", "tree"), factor=4):
+        self.radius = radius
+        self.bounds = bounds
+        self.period = period
+        self.skin = skin
+        self.backends = backends
+        self.factor = factor
+        self.backend = None
+        self.name = None
+        self.timings = {}               # backend name -> seconds at the last calibration
+        self.calibrated = None          # (N, density) at the last calibration
+
+    def needs_calibration(self, boids):
+        if self.backend is None:
+            return True
+        n, rho = self.calibrated
+        now_n, now_rho = len(boids), density(boids, self.radius)
+        return not (n / self.factor <= now_n <= n * self.factor and rho / self.factor <= now_rho <= rho * self.factor)
+
+    def calibrate(self, boids):
+        candidates = {name: create_backend(name, self.radius, self.bounds, self.period, self.skin) for name in self.backends}
+        self.timings = {name: time_backend(backend, boids) for name, backend in candidates.items()}
+        self.name = min(self.timings, key=self.timings.get)
+        self.backend = candidates[self.name]
+        self.calibrated = (len(boids), density(boids, self.radius))
+
+    def update(self, boids):            # once per tick
+        if self.needs_calibration(boids):
+            self.calibrate(boids)
+        self.backend.update(boids)
+
+    def neighbours(self, boid):
+        return self.backend.neighbours(boid)
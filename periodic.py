@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+
+# Minimum-image helpers for a toroidal (wraparound) world of size period = (width, height).
+# With period None every helper falls back to plain Euclidean offsets.
+
+
+def min_image(delta, size):
+    return delta - size * round(delta / size)
+
+
+def offset(a, b, period=None):          # vector from a to the nearest image of b
+    d = b - a
+    if period is not None:
+        d.x = min_image(d.x, period[0])
+        d.y = min_image(d.y, period[1])
+    return d
+
+
+def distance(a, b, period=None):
+    if period is None:
+        return a.distance_to(b)
+    return math.hypot(min_image(b.x - a.x, period[0]), min_image(b.y - a.y, period[1]))
+
+
+def offset_arrays(diff, period=None):   # (..., 2) differences -> minimum image
+    if period is None:
+        return diff
+    size = np.asarray(period, dtype=float)
+    return diff - size * np.round(diff / size)
+
+
+def image_shifts(point, radius, period):
+    # Shifts of a query point that reach across the seams, (0, 0) first
+    shifts = [(0.0, 0.0)]
+    if period is None:
+        return shifts
+    xs = [0.0]
+    ys = [0.0]
+    if point[0] - radius < 0:
+        xs.append(period[0])
+    if point[0] + radius >= period[0]:
+        xs.append(-period[0])
+    if point[1] - radius < 0:
+        ys.append(period[1])
+    if point[1] + radius >= period[1]:
+        ys.append(-period[1])
+    shifts += [(sx, sy) for sx in xs for sy in ys if (sx, sy) != (0.0, 0.0)]
+    return shifts
@@ -1,6 +1,14 @@
 import pygame
 import random
 import math
+import concurrent.futures
+
+import numpy as np
+
+import flocking
+import stepping
+from wall_bvh import WallBVH
+from dirty_render import DirtyRenderer, line_rect
 
 scale = 1
 
@@ -12,6 +20,10 @@ num_boids = 10
 max_speed = 4 * scale
 max_force = 0.1 * scale
 perception_radius = 50
+update_mode = "inplace"     # "inplace": boid by boid, "sync": double-buffered, "array": double-buffered NumPy
+array_pairs = "grid"        # array mode neighbour pairs: "brute" distance matrix or "grid" cells
+morton_interval = 20        # array mode: re-sort rows by Morton code every this many ticks, 0 never
+dirty_rendering = True      # redraw and update only around what moved; walls/obstacles are redrawn over boids where they overlap
 
 # Obstacle properties
 max_force_avoidance = 0.3 * scale
@@ -28,13 +40,16 @@ class Boid:
         self.velocity = pygame.math.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))
         self.velocity.scale_to_length(max_speed)
         self.acceleration = pygame.math.Vector2(0, 0)
+        self.neighbours = []
 
     def apply_behavior(self, boids, obstacles, walls):
+        flock = flocking.accumulate(self, boids, perception_radius, power=2)   # single pass over boids
+        self.neighbours = flock.neighbours
         self.acceleration = pygame.math.Vector2(0, 0)
         self.acceleration += self.avoid_edges()
-        self.acceleration += self.align(boids)
-        self.acceleration += self.cohesion(boids)
-        self.acceleration += self.separation(boids)
+        self.acceleration += self.align(flock)
+        self.acceleration += self.cohesion(flock)
+        self.acceleration += self.separation(flock)
         self.acceleration += self.avoid_obstacle(obstacles)
         self.acceleration += self.avoid_walls(walls)
         
@@ -52,30 +67,20 @@ class Boid:
             self.position + pygame.math.Vector2(math.cos(math.radians(angle - 160)), -math.sin(math.radians(angle - 160))) * 10,
         ])
 
-    def align(self, boids):
+    def align(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                steering += boid.velocity
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.velocity_sum / flock.total
             steering.scale_to_length(max_speed)
             steering -= self.velocity
             if steering.length() > max_force:
                 steering.scale_to_length(max_force)
         return steering
 
-    def cohesion(self, boids):
+    def cohesion(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                steering += boid.position
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.position_sum / flock.total
             steering -= self.position
             steering.scale_to_length(max_speed)
             steering -= self.velocity
@@ -83,28 +88,30 @@ class Boid:
                 steering.scale_to_length(max_force)
         return steering
 
-    def separation(self, boids):
+    def separation(self, flock):
         steering = pygame.math.Vector2(0, 0)
-        total = 0
-        for boid in boids:
-            distance = self.position.distance_to(boid.position)
-            if boid != self and distance < perception_radius:
-                diff = self.position - boid.position
-                diff /= distance**2
-                steering += diff
-                total += 1
-        if total > 0:
-            steering /= total
+        if flock.total > 0:
+            steering = flock.repulsion_sum / flock.total
             steering.scale_to_length(max_speed)
             steering -= self.velocity
             if steering.length() > max_force:
                 steering.scale_to_length(max_force)
         return steering
     
-    def show_perception(self, boids, screen):
-        for boid in boids:
-            if boid != self and self.position.distance_to(boid.position) < perception_radius:
-                pygame.draw.line(screen, red, self.position, boid.position, 2)
+    def show_perception(self, screen):                 # neighbours gathered in apply_behavior
+        for boid in self.neighbours:
+            pygame.draw.line(screen, red, self.position, boid.position, 2)
+
+    def render_items(self, i):                          # DirtyRenderer items for this boid and its perception lines
+        position = (self.position.x, self.position.y)
+        items = []
+        if self.neighbours:
+            ends = tuple((boid.position.x, boid.position.y) for boid in self.neighbours)
+            bounds = line_rect(position, ends[0], 2).unionall([line_rect(position, end, 2) for end in ends[1:]])
+            items.append((("perception", i), (position, ends), bounds, lambda surface, ends=ends: draw_lines(surface, position, ends)))
+        body = (position, self.velocity.x, self.velocity.y)
+        items.append((("boid", i), body, pygame.Rect(int(position[0]) - 11, int(position[1]) - 11, 23, 23), self.show))
+        return items
     
     def avoid_edges(self):
         steering = pygame.math.Vector2(0, 0)
@@ -141,12 +148,10 @@ class Boid:
     
     def avoid_walls(self, walls):
         steering = pygame.math.Vector2(0, 0)
-        for wall in walls:
-            distance = wall.distance_to(self.position)
-            if distance < perception_radius:
-                # Get vector perpendicular to the wall
-                perp = wall.get_perpendicular(self.position)
-                steering += perp
+        for wall in walls.query(self.position, perception_radius):     # only walls within perception_radius
+            # Get vector perpendicular to the wall
+            perp = wall.get_perpendicular(self.position)
+            steering += perp
         if steering.length() > 0:
             steering.scale_to_length(max_speed)
             steering -= self.velocity
@@ -162,6 +167,10 @@ class Obstacle:
     def show(self, screen):
         pygame.draw.circle(screen, red, (int(self.position.x), int(self.position.y)), self.radius)
 
+    def render_item(self, k):                           # DirtyRenderer item, never changes
+        x, y = int(self.position.x), int(self.position.y)
+        return ("obstacle", k), None, pygame.Rect(x - self.radius - 1, y - self.radius - 1, 2 * self.radius + 3, 2 * self.radius + 3), self.show
+
 class Wall:
     def __init__(self, start_x, start_y, end_x, end_y):
         self.start = pygame.math.Vector2(start_x, start_y)
@@ -169,6 +178,9 @@ class Wall:
     
     def show(self, screen):
         pygame.draw.line(screen, red, self.start, self.end, 5)
+
+    def render_item(self, k):                           # DirtyRenderer item, never changes
+        return ("wall", k), None, line_rect(self.start, self.end, 5), self.show
     
     def distance_to(self, point):
         # find the closest distance
@@ -191,6 +203,47 @@ class Wall:
             perp_vector = -perp_vector
         return perp_vector.normalize()
 
+def behaviour_arrays(position, velocity, obstacles, walls, seen=None):
+    # apply_behavior for all boids at once, on the front buffer; seen, if given, receives the (i, j) rows where i sees j
+    i, j = flocking.pairs(position, perception_radius, array_pairs)
+    if seen is not None:
+        seen[:] = i, j
+    sums = flocking.accumulate_pairs(position, velocity, i, j, power=2)
+    al, coh, sep = flocking.steering_arrays(position, velocity, *sums, max_speed, max_force)
+
+    # Edges
+    edge = np.zeros_like(position)
+    edge[:, 0] = np.where(position[:, 0] < perception_radius, max_speed, np.where(position[:, 0] > width - perception_radius, -max_speed, 0))
+    edge[:, 1] = np.where(position[:, 1] < perception_radius, max_speed, np.where(position[:, 1] > height - perception_radius, -max_speed, 0))
+
+    # Obstacles
+    away = np.zeros_like(position)
+    for obstacle in obstacles:
+        diff = position - (obstacle.position.x, obstacle.position.y)
+        distance = np.hypot(diff[:, 0], diff[:, 1])
+        near = (distance < obstacle.radius + perception_radius) & (distance > 0)
+        away[near] += diff[near] / distance[near, None]
+
+    acceleration = flocking.steer(edge, velocity, max_speed, max_force_edges) + al + coh + sep
+    acceleration += flocking.steer(away, velocity, max_speed, max_force_avoidance)
+    acceleration += flocking.steer(walls.perpendicular_sums(position, perception_radius), velocity, max_speed, max_force_avoidance)
+    return acceleration
+
+def draw_lines(surface, start, ends):
+    for end in ends:
+        pygame.draw.line(surface, red, start, end, 2)
+
+def store_neighbours(boids, ids, i, j):     # array mode: Boid.neighbours from the behaviour's pairs, for show_perception
+    for boid in boids:
+        boid.neighbours = []
+    for a, b in zip(ids[i].tolist(), ids[j].tolist()):
+        boids[a].neighbours.append(boids[b])
+
+def integrate_arrays(position, velocity, acceleration, next_position, next_velocity):
+    # Boid.update for all boids, into the back buffer
+    next_velocity[:] = flocking.limit(velocity + acceleration, max_speed)
+    next_position[:] = position + next_velocity
+
 def main():
     pygame.init()
     screen = pygame.display.set_mode((width, height))
@@ -212,6 +265,16 @@ def main():
         Wall(500, 000, 500, 500),
         Wall(700, 100, 700, 600),
     ]
+    walls = WallBVH(walls)      # spatial index over the wall segments, iterates like the list
+
+    executor = concurrent.futures.ThreadPoolExecutor() if update_mode == "sync" else None
+    buffers = None
+    if update_mode == "array":
+        buffers = stepping.SwarmBuffers(len(boids))
+        buffers.load(boids)
+    seen = []
+    tick = 0
+    renderer = DirtyRenderer(screen, black) if dirty_rendering else None
 
 
     running = True
@@ -220,23 +283,41 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
 
-        screen.fill(black)
+        # Apply behaviours (incl. avoid obstacles and edges) and update boids
+        if update_mode == "inplace":
+            stepping.step_inplace(boids, lambda boid: boid.apply_behavior(boids, obstacles, walls))
+        elif update_mode == "sync":
+            stepping.step_synchronous(boids, lambda boid: boid.apply_behavior(boids, obstacles, walls), executor)
+        elif update_mode == "array":
+            if morton_interval > 0 and tick % morton_interval == 0:
+                buffers.sort_by_morton(perception_radius)   # boids keep their list order, only rows move
+            buffers.step(lambda position, velocity: behaviour_arrays(position, velocity, obstacles, walls, seen), integrate_arrays)
+            buffers.store(boids)
+            store_neighbours(boids, buffers.ids, *seen)
 
-        for boid in boids:
-            boid.show_perception(boids, screen)         # show nearby boids
-            boid.apply_behavior(boids, obstacles, walls)       # incl. avoid obstacles and edges
-            boid.update()
-            boid.show(screen)
-        
-        for obstacle in obstacles:
-            obstacle.show(screen)
+        if renderer is not None:
+            # obstacles and walls go last so they are drawn over the boids, as in the full redraw below
+            items = [item for i, boid in enumerate(boids) for item in boid.render_items(i)]
+            items += [shape.render_item(k) for k, shape in enumerate([*obstacles, *walls])]
+            renderer.render(items)
+        else:
+            screen.fill(black)
+            for boid in boids:
+                boid.show_perception(screen)                # show nearby boids
+                boid.show(screen)
+            
+            for obstacle in obstacles:
+                obstacle.show(screen)
 
-        for wall in walls:
-            wall.show(screen)
+            for wall in walls:
+                wall.show(screen)
 
-        pygame.display.flip()
+            pygame.display.flip()
         clock.tick(30)
+        tick += 1
 
+    if executor is not None:
+        executor.shutdown()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,27 @@
+# Sleeping agents: boids frozen at a POI (mode 2) are parked in a static set.
+# They keep their place in the neighbour search, but behaviour and update are
+# skipped until their target is removed or their neighbourhood changes: a
+# neighbour comes or goes, a neighbour's rank changes, or the boid gains or
+# loses a path to a leader. A sleeper's own rank depends on exactly those.
+
+
+class SleepSet:
+    def __init__(self):
+        self.sleeping = {}              # boid -> (target, surroundings() when it fell asleep)
+
+    def awake(self, boids):
+        return [boid for boid in boids if boid not in self.sleeping]
+
+    @staticmethod
+    def surroundings(boid, boids):      # what the rank of a frozen boid depends on
+        return frozenset((neighbour, neighbour.rank) for neighbour in boid.get_neighbours(boids)), boid.check_leader(boids)
+
+    def settle(self, boids):            # before wake: boids frozen by the last update go to sleep
+        for boid in boids:
+            if boid.mode == 2 and boid.target is not None and boid not in self.sleeping:
+                self.sleeping[boid] = (boid.target, self.surroundings(boid, boids))
+
+    def wake(self, boids, POIs):        # before behaviour: wake on target removal or a neighbour event
+        for boid, (target, surroundings) in list(self.sleeping.items()):
+            if target not in POIs or self.surroundings(boid, boids) != surroundings:
+                del self.sleeping[boid]
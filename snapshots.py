@@ -0,0 +1,103 @@
+import threading
+import time
+
+import periodic
+
+# Simulation/render decoupling for main.py. A FixedStepLoop thread advances the
+# simulation at a fixed rate and publishes an immutable Snapshot after every
+# step; the renderer only ever reads the last two published snapshots and
+# draws in between them, so frame rate and step rate are independent.
+
+
+class Snapshot:
+    __slots__ = ("time", "tick", "boids", "edges", "POIs", "chunks")
+
+    def __init__(self, time, tick, boids, edges, POIs, chunks=None):
+        self.time = time                # perf_counter() when the step finished
+        self.tick = tick
+        self.boids = boids              # [(x, y, angle, rank, label)] in a fixed boid order
+        self.edges = edges              # edges[i]: rows of the boids that boid i perceives, [] if not captured
+        self.POIs = POIs                # [(x, y)]
+        self.chunks = chunks            # {chunk key: (boid rows, POI rows)} of a chunked world, else None
+
+
+class SnapshotBuffer:
+    # Double buffer of completed snapshots: the writer replaces both references under the lock
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.previous = None
+        self.latest = None
+
+    def publish(self, snapshot):
+        with self.lock:
+            self.previous, self.latest = self.latest if self.latest is not None else snapshot, snapshot
+
+    def read(self):
+        with self.lock:
+            return self.previous, self.latest
+
+
+class FixedStepLoop(threading.Thread):
+    # Calls step() `rate` times per second and publishes capture() after each call. When a step
+    # overruns it catches up with at most `max_catch_up` back-to-back steps, then drops the backlog.
+    # An exception from step() or capture() ends the loop and is kept in `error`; stop() re-raises it.
+    def __init__(self, step, capture, buffer, rate, max_catch_up=5):
+        super().__init__(daemon=True)
+        self.step = step
+        self.capture = capture
+        self.buffer = buffer
+        self.rate = rate
+        self.max_catch_up = max_catch_up
+        self.stopped = threading.Event()
+        self.steps = 0
+        self.dropped = 0                # steps skipped because the simulation fell behind
+        self.error = None
+
+    def run(self):
+        interval = 1 / self.rate
+        due = time.perf_counter()
+        while not self.stopped.is_set():
+            now = time.perf_counter()
+            if now < due:
+                self.stopped.wait(due - now)
+                continue
+            done = 0
+            while due <= now and done < self.max_catch_up:
+                try:
+                    self.step()
+                    self.buffer.publish(self.capture())
+                except Exception as error:
+                    self.error = error
+                    self.stopped.set()
+                    return
+                self.steps += 1
+                due += interval
+                done += 1
+            if due <= now:
+                self.dropped += int((now - due) / interval) + 1
+                due = now + interval
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def blend(a, b, alpha, size=None):     # a + alpha * (b - a), across the seam when size is given
+    d = b - a if size is None else periodic.min_image(b - a, size)
+    x = a + alpha * d
+    return x if size is None else x % size
+
+
+def interpolate(previous, latest, alpha, period=None, rows=None):
+    # boids of the two snapshots (only `rows` if given) blended at alpha in [0, 1]; ranks and labels come from the latest
+    rows = range(len(latest.boids)) if rows is None else rows
+    if previous is None or len(previous.boids) != len(latest.boids):
+        return [latest.boids[i] for i in rows]
+    width, height = period if period is not None else (None, None)
+    blended = []
+    for i in rows:
+        (x0, y0, a0, _, _), (x1, y1, a1, rank, label) = previous.boids[i], latest.boids[i]
+        blended.append((blend(x0, x1, alpha, width), blend(y0, y1, alpha, height), a0 + alpha * periodic.min_image(a1 - a0, 360.0), rank, label))
+    return blended
@@ -0,0 +1,68 @@
+import numpy as np
+
+import morton
+
+# Update orderings for the flocking scripts
+#   step_inplace:      behaviour and update boid by boid, later boids see earlier boids already moved
+#   step_synchronous:  compute/commit split as in main.py, every boid reads the same front state
+#   SwarmBuffers:      the synchronous step on NumPy front/back buffers for vectorised behaviours;
+#                      rows can be reordered for locality, ids/rows map them back to boids[id]
+
+
+def step_inplace(boids, behave):
+    for boid in boids:
+        behave(boid)
+        boid.update()
+
+
+def step_synchronous(boids, behave, executor=None):
+    # Behaviour phase: reads positions/velocities (front), each boid only writes its own acceleration (back)
+    if executor is None:
+        for boid in boids:
+            behave(boid)
+    else:
+        list(executor.map(behave, boids))
+    # Commit phase
+    for boid in boids:
+        boid.update()
+
+
+class SwarmBuffers:
+    def __init__(self, n):
+        self.front = (np.zeros((n, 2)), np.zeros((n, 2)))      # position, velocity as last committed
+        self.back = (np.zeros((n, 2)), np.zeros((n, 2)))       # next position, velocity
+        self.acceleration = np.zeros((n, 2))
+        self.ids = np.arange(n)                 # row -> external id (index into the boids list)
+        self.rows = np.arange(n)                # external id -> row
+
+    def load(self, boids):                  # object model -> front buffer
+        position, velocity = self.front
+        for i, boid in enumerate(boids):
+            position[self.rows[i]] = boid.position.x, boid.position.y
+            velocity[self.rows[i]] = boid.velocity.x, boid.velocity.y
+
+    def store(self, boids):                 # front buffer -> object model
+        position, velocity = self.front
+        for i, boid in enumerate(boids):
+            row = self.rows[i]
+            boid.position.update(position[row, 0], position[row, 1])
+            boid.velocity.update(velocity[row, 0], velocity[row, 1])
+            boid.acceleration.update(self.acceleration[row, 0], self.acceleration[row, 1])
+
+    def reorder(self, order):               # new row r holds old row order[r]
+        self.front = tuple(a[order] for a in self.front)
+        self.back = tuple(a[order] for a in self.back)
+        self.acceleration = self.acceleration[order]
+        self.ids = self.ids[order]
+        self.rows[self.ids] = np.arange(len(self.ids))
+
+    def sort_by_morton(self, cell_size):    # spatially close boids end up in neighbouring rows
+        self.reorder(morton.order(self.front[0], cell_size))
+
+    def step(self, behave, integrate):
+        # behave(position, velocity) -> acceleration, reading the front buffer only
+        # integrate(position, velocity, acceleration, next_position, next_velocity) fills the back buffer
+        position, velocity = self.front
+        self.acceleration[:] = behave(position, velocity)
+        integrate(position, velocity, self.acceleration, *self.back)
+        self.front, self.back = self.back, self.front
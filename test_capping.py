@@ -0,0 +1,106 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from capping import EMPTY, cap, closest_candidate, project, project_arrays, strategies
+
+# Property checks for capping.project(): feasible, never farther from the request
+# than the old candidate enumerator or any sampled boundary point, and matched
+# by the vectorised project_arrays(); and every cap() strategy stays feasible
+# without beating "exact". Run with pytest.
+
+# (max_speed, max_force) of main.py / Presentation1.py and of Hierarchy_decision.py
+configs = [(4, 3), (3, 0.5)]
+
+
+def random_case(rng, max_speed, max_force):
+    # velocities and requests around the constraint circles, with exact degenerate cases mixed in
+    speed = rng.choice([0.0, max_speed, rng.uniform(0, 1.5 * max_speed)])
+    angle = rng.uniform(0, 2 * math.pi)
+    vx, vy = speed * math.cos(angle), speed * math.sin(angle)
+    min_speed = rng.choice([0.0, max_speed, rng.uniform(0, max_speed)])
+    dt = rng.choice([1, 0.5, 2])
+    kind = rng.random()
+    if kind < 0.1:
+        ax, ay = 0.0, 0.0
+    elif kind < 0.2:
+        ax, ay = -vx / dt, -vy / dt                     # request at the annulus centre
+    else:
+        reach = 2 * (max_force + max_speed / dt)
+        ax, ay = rng.uniform(-reach, reach), rng.uniform(-reach, reach)
+    return ax, ay, vx, vy, min_speed, dt
+
+
+@pytest.fixture(scope="module", params=configs, ids=lambda config: "speed%s-force%s" % config)
+def config(request):
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def cases(config):
+    rng = random.Random(0)
+    return [random_case(rng, *config) for _ in range(2000)]
+
+
+def test_feasible_and_not_farther_than_enumerator(config, cases):
+    max_speed, max_force = config
+    for ax, ay, vx, vy, low, dt in cases:
+        (x, y), code = project(ax, ay, vx, vy, low, max_speed, max_force, dt)
+        reference, _ = closest_candidate(ax, ay, vx, vy, low, max_speed, max_force, dt)
+        if code == EMPTY:
+            assert reference is None, (ax, ay, vx, vy, low, dt)
+            continue
+        cx, cy = -vx / dt, -vy / dt
+        assert math.hypot(x, y) <= max_force + 1e-7
+        assert min(low, max_speed) / dt - 1e-7 <= math.hypot(x - cx, y - cy) <= max_speed / dt + 1e-7
+        if reference is not None:
+            assert math.hypot(x - ax, y - ay) <= math.hypot(reference[0] - ax, reference[1] - ay) + 1e-7, (ax, ay, vx, vy, low, dt)
+
+
+def test_no_sampled_boundary_point_is_closer(config, cases, samples=720):
+    max_speed, max_force = config
+    angles = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    ring = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    for ax, ay, vx, vy, low, dt in cases:
+        (x, y), code = project(ax, ay, vx, vy, low, max_speed, max_force, dt)
+        if code == EMPTY:
+            continue
+        cx, cy = -vx / dt, -vy / dt
+        inner, outer = min(low, max_speed) / dt, max_speed / dt
+        boundary = np.concatenate([ring * max_force, [cx, cy] + ring * outer, [cx, cy] + ring * inner])
+        speed = np.hypot(boundary[:, 0] - cx, boundary[:, 1] - cy)
+        ok = (np.hypot(boundary[:, 0], boundary[:, 1]) <= max_force + 1e-9) & (speed >= inner - 1e-9) & (speed <= outer + 1e-9)
+        if ok.any():
+            assert math.hypot(x - ax, y - ay) <= np.hypot(boundary[ok, 0] - ax, boundary[ok, 1] - ay).min() + 1e-7
+
+
+@pytest.mark.parametrize("dt", [1, 0.5, 2])
+def test_arrays_match_scalar(config, cases, dt):
+    max_speed, max_force = config
+    rows = [case for case in cases if case[5] == dt]
+    acc = np.array([case[:2] for case in rows])
+    velocity = np.array([case[2:4] for case in rows])
+    low = np.array([case[4] for case in rows])
+    capped, code = project_arrays(acc, velocity, low, max_speed, max_force, dt)
+    for i, (ax, ay, vx, vy, m, _) in enumerate(rows):
+        point, kind = project(ax, ay, vx, vy, m, max_speed, max_force, dt)
+        # ties (a request at a circle centre) may pick different points at the same distance
+        gap = math.hypot(capped[i, 0] - ax, capped[i, 1] - ay) - math.hypot(point[0] - ax, point[1] - ay)
+        assert abs(gap) <= 1e-9 and (code[i] == EMPTY) == (kind == EMPTY), (rows[i], capped[i], code[i], point, kind)
+
+
+@pytest.mark.parametrize("strategy", sorted(strategies))
+def test_strategy_feasible_and_not_closer_than_exact(config, cases, strategy):
+    max_speed, max_force = config
+    for ax, ay, vx, vy, low, dt in cases:
+        exact, exact_code = project(ax, ay, vx, vy, low, max_speed, max_force, dt)
+        (x, y), code = cap(strategy, ax, ay, vx, vy, low, max_speed, max_force, dt)
+        assert (code == EMPTY) == (exact_code == EMPTY), (ax, ay, vx, vy, low, dt)
+        if code == EMPTY:
+            continue
+        speed = math.hypot(x + vx / dt, y + vy / dt)
+        assert math.hypot(x, y) <= max_force + 1e-5
+        assert min(low, max_speed) / dt - 1e-5 <= speed <= max_speed / dt + 1e-5
+        assert math.hypot(x - ax, y - ay) >= math.hypot(exact[0] - ax, exact[1] - ay) - 1e-7
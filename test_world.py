@@ -0,0 +1,43 @@
+import random
+
+import pygame
+import pytest
+
+import periodic
+from world import ChunkedWorld
+
+# ChunkedWorld lookups must return every point within the radius, across the
+# seams of a wrapping world too, whether or not the chunks divide the world
+# evenly. Run with pytest.
+
+
+class Point:
+    def __init__(self, x, y):
+        self.position = pygame.math.Vector2(x, y)
+
+
+def test_wrapped_lookup_crosses_an_uneven_seam():
+    world = ChunkedWorld(1200, 900, 400, (1200, 900))
+    poi = Point(100, 780)
+    world.add_poi(poi)
+    assert world.pois_near(pygame.math.Vector2(100, 50), 200) == [poi]
+
+
+@pytest.mark.parametrize("size", [(1200, 900), (1200, 700), (1000, 1000), (350, 260)])
+@pytest.mark.parametrize("wrap", [False, True], ids=["bounded", "wrapped"])
+def test_lookups_find_everything_in_range(size, wrap):
+    width, height = size
+    period = size if wrap else None
+    world = ChunkedWorld(width, height, 400, period)
+    rng = random.Random(0)
+    boids = [Point(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(300)]
+    POIs = [Point(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(100)]
+    world.update(boids)
+    for poi in POIs:
+        world.add_poi(poi)
+    for _ in range(200):
+        centre = pygame.math.Vector2(rng.uniform(0, width), rng.uniform(0, height))
+        radius = rng.choice([50, 200, 450])
+        for found, points in ((world.boids_near(centre, radius), boids), (world.pois_near(centre, radius), POIs)):
+            near = {point for point in points if periodic.distance(centre, point.position, period) < radius}
+            assert near <= set(found), (centre, radius)
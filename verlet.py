@@ -0,0 +1,63 @@
+import math
+
+import periodic
+
+# Verlet neighbour lists: candidates are gathered within radius + skin and reused
+# until some boid has moved more than skin / 2 since the last build; the exact
+# radius is applied when the list is read. With a period (width, height) the
+# cells wrap around and all distances are minimum-image distances.
+
+
+class VerletList:
+    def __init__(self, radius, skin, period=None):
+        self.radius = radius
+        self.skin = skin
+        self.period = period
+        self.candidates = {}            # boid -> boids within radius + skin at the last build
+        self.reference = {}             # boid -> position at the last build
+
+    def needs_rebuild(self, boids):
+        if len(boids) != len(self.reference):
+            return True
+        limit = self.skin / 2
+        for boid in boids:
+            if boid not in self.reference or periodic.distance(boid.position, self.reference[boid], self.period) > limit:
+                return True
+        return False
+
+    def update(self, boids):            # call once per tick, before any neighbours() query
+        if self.needs_rebuild(boids):
+            self.rebuild(boids)
+
+    def rebuild(self, boids):
+        reach = self.radius + self.skin
+        if self.period is None:
+            size = (reach, reach)
+            wrap = None
+        else:
+            # whole number of cells per side, each at least `reach` wide
+            wrap = (max(1, int(self.period[0] // reach)), max(1, int(self.period[1] // reach)))
+            size = (self.period[0] / wrap[0], self.period[1] / wrap[1])
+
+        cells = {}
+        for boid in boids:
+            key = (int(math.floor(boid.position.x / size[0])), int(math.floor(boid.position.y / size[1])))
+            if wrap is not None:
+                key = (key[0] % wrap[0], key[1] % wrap[1])
+            cells.setdefault(key, []).append(boid)
+
+        self.candidates = {boid: [] for boid in boids}
+        for (cx, cy), members in cells.items():
+            around = {(cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+            if wrap is not None:
+                around = {(x % wrap[0], y % wrap[1]) for x, y in around}
+            for key in around:
+                for other in cells.get(key, ()):
+                    for boid in members:
+                        if other is not boid and periodic.distance(boid.position, other.position, self.period) < reach:
+                            self.candidates[boid].append(other)
+        self.reference = {boid: boid.position.copy() for boid in boids}
+
+    def neighbours(self, boid):         # boids within the exact radius
+        return [other for other in self.candidates.get(boid, ())
+                if periodic.distance(boid.position, other.position, self.period) < self.radius]
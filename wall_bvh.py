@@ -0,0 +1,141 @@
+import numpy as np
+
+# Bounding-volume hierarchy over Wall segments, so each boid only tests the walls
+# whose bounding boxes lie within its perception radius
+
+leaf_size = 4           # max segments per leaf node
+
+
+def segment_distances(points, starts, ends):
+    # Batched point-to-segment kernel
+    # points (N, 2), starts/ends (M, 2) -> distances (N, M), normals (N, M, 2)
+    # normals match Wall.get_perpendicular: unit perpendicular of the wall, on the side of the point
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+
+    line = ends - starts                                            # (M, 2)
+    length_sq = np.einsum("ij,ij->i", line, line)                   # (M,)
+    rel = points[:, None, :] - starts[None, :, :]                   # (N, M, 2)
+
+    # Project the points onto the lines, clamped to the segments
+    t = np.einsum("nmk,mk->nm", rel, line) / np.where(length_sq > 0, length_sq, 1)
+    t = np.clip(t, 0, 1)
+    diff = rel - t[..., None] * line[None, :, :]
+    distances = np.hypot(diff[..., 0], diff[..., 1])
+
+    # Perpendicular pointing away from the wall, towards the point
+    length = np.sqrt(length_sq)
+    perp = np.stack((-line[:, 1], line[:, 0]), axis=1) / np.where(length > 0, length, 1)[:, None]
+    side = np.einsum("nmk,mk->nm", rel, perp)
+    normals = np.where((side < 0)[..., None], -perp[None, :, :], perp[None, :, :])
+    return distances, normals
+
+
+class WallBVH:
+    def __init__(self, walls):
+        self.walls = list(walls)
+        self.starts = np.array([[wall.start.x, wall.start.y] for wall in self.walls], dtype=float).reshape(-1, 2)
+        self.ends = np.array([[wall.end.x, wall.end.y] for wall in self.walls], dtype=float).reshape(-1, 2)
+
+        # Flat node storage: box, children (-1 for leaves) and the slice of self.order held by a leaf
+        self.box_min = []
+        self.box_max = []
+        self.left = []
+        self.right = []
+        self.first = []
+        self.count = []
+        self.order = np.arange(len(self.walls))
+        if len(self.walls) > 0:
+            self.build(0, len(self.walls))
+        self.box_min = np.array(self.box_min).reshape(-1, 2)
+        self.box_max = np.array(self.box_max).reshape(-1, 2)
+
+    def __iter__(self):                 # iterate like the plain wall list, e.g. for drawing
+        return iter(self.walls)
+
+    def __len__(self):
+        return len(self.walls)
+
+    def build(self, first, last):       # top-down median split on segment midpoints
+        segments = self.order[first:last]
+        lo = np.minimum(self.starts[segments], self.ends[segments]).min(axis=0)
+        hi = np.maximum(self.starts[segments], self.ends[segments]).max(axis=0)
+        node = len(self.box_min)
+        self.box_min.append(lo)
+        self.box_max.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.first.append(first)
+        self.count.append(last - first)
+        if last - first <= leaf_size:
+            return node
+
+        # Split along the longer axis of the box
+        axis = int(np.argmax(hi - lo))
+        mids = (self.starts[segments, axis] + self.ends[segments, axis]) / 2
+        self.order[first:last] = segments[np.argsort(mids, kind="stable")]
+        half = (first + last) // 2
+        self.left[node] = self.build(first, half)
+        self.right[node] = self.build(half, last)
+        return node
+
+    def box_distance(self, node, points):
+        # distance from each point to the node's bounding box (0 inside)
+        d = np.maximum(np.maximum(self.box_min[node] - points, points - self.box_max[node]), 0)
+        return np.hypot(d[..., 0], d[..., 1])
+
+    def candidates(self, point, radius):    # indices of walls whose boxes are within radius of a point
+        found = []
+        if len(self.walls) == 0:
+            return found
+        p = np.array([point[0], point[1]], dtype=float)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self.box_distance(node, p) > radius:
+                continue
+            if self.left[node] == -1:
+                found.extend(self.order[self.first[node]:self.first[node] + self.count[node]])
+            else:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+        return found
+
+    def query(self, point, radius):         # walls within radius of a point, exact
+        return [self.walls[i] for i in self.candidates(point, radius)
+                if self.walls[i].distance_to(point) < radius]
+
+    def query_batch(self, points, radius):
+        # All points at once: returns matching (point index, wall index, distance, normal) arrays
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        hits_p, hits_w, hits_d, hits_n = [], [], [], []
+        if len(self.walls) > 0 and len(points) > 0:
+            stack = [(0, np.arange(len(points)))]
+            while stack:
+                node, idx = stack.pop()
+                idx = idx[self.box_distance(node, points[idx]) <= radius]      # points that still see this box
+                if len(idx) == 0:
+                    continue
+                if self.left[node] == -1:
+                    walls = self.order[self.first[node]:self.first[node] + self.count[node]]
+                    distances, normals = segment_distances(points[idx], self.starts[walls], self.ends[walls])
+                    p, w = np.nonzero(distances < radius)
+                    hits_p.append(idx[p])
+                    hits_w.append(walls[w])
+                    hits_d.append(distances[p, w])
+                    hits_n.append(normals[p, w])
+                else:
+                    stack.append((self.left[node], idx))
+                    stack.append((self.right[node], idx))
+        if not hits_p:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0), np.zeros((0, 2))
+        return np.concatenate(hits_p), np.concatenate(hits_w), np.concatenate(hits_d), np.concatenate(hits_n)
+
+    def perpendicular_sums(self, points, radius):
+        # Sum of wall perpendiculars within radius for every point, i.e. the raw avoid_walls steering
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        sums = np.zeros_like(points)
+        p, _, _, normals = self.query_batch(points, radius)
+        np.add.at(sums, p, normals)
+        return sums
@@ -0,0 +1,130 @@
+import math
+
+import pygame
+
+# Large worlds: the area is cut into square chunks, each holding the boids
+# and POIs inside it, so lookups around a point and drawing a view only
+# touch the chunks involved. Chunks are created on first use, so empty parts
+# of a huge world cost nothing. In a wrapping world the chunks are stretched
+# to divide the period exactly, so chunk keys wrap with the coordinates.
+# The Camera maps a pannable, zoomable view of the world onto the window.
+
+
+class Chunk:
+    __slots__ = ("boids", "POIs")
+
+    def __init__(self):
+        self.boids = []
+        self.POIs = []
+
+
+class ChunkedWorld:
+    def __init__(self, width, height, chunk_size, period=None):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.period = period                # (width, height) when the world wraps
+        self.columns = max(1, math.ceil(width / chunk_size))
+        self.rows = max(1, math.ceil(height / chunk_size))
+        if period is not None:
+            self.size = (period[0] / self.columns, period[1] / self.rows)
+        else:
+            self.size = (chunk_size, chunk_size)
+        self.chunks = {}
+        self.owner = {}                     # boid or POI -> key of the chunk holding it
+
+    def key(self, x, y):
+        cx, cy = int(math.floor(x / self.size[0])), int(math.floor(y / self.size[1]))
+        if self.period is not None:
+            return cx % self.columns, cy % self.rows
+        return min(max(cx, 0), self.columns - 1), min(max(cy, 0), self.rows - 1)
+
+    def chunk(self, key):
+        if key not in self.chunks:
+            self.chunks[key] = Chunk()
+        return self.chunks[key]
+
+    def keys_in(self, x0, y0, x1, y1):      # chunks overlapping a world rectangle
+        c0, r0 = int(math.floor(x0 / self.size[0])), int(math.floor(y0 / self.size[1]))
+        c1, r1 = int(math.floor(x1 / self.size[0])), int(math.floor(y1 / self.size[1]))
+        if self.period is None:
+            c0, r0 = max(c0, 0), max(r0, 0)
+            c1, r1 = min(c1, self.columns - 1), min(r1, self.rows - 1)
+            return [(c, r) for c in range(c0, c1 + 1) for r in range(r0, r1 + 1)]
+        columns = {c % self.columns for c in range(c0, min(c1, c0 + self.columns - 1) + 1)}
+        rows = {r % self.rows for r in range(r0, min(r1, r0 + self.rows - 1) + 1)}
+        return [(c, r) for c in columns for r in rows]
+
+    def keys_near(self, position, radius):
+        return self.keys_in(position.x - radius, position.y - radius, position.x + radius, position.y + radius)
+
+    # Boids move every tick: update() moves the ones that crossed a chunk border
+    def update(self, boids):
+        for boid in boids:
+            key = self.key(boid.position.x, boid.position.y)
+            old = self.owner.get(boid)
+            if old != key:
+                if old is not None:
+                    self.chunks[old].boids.remove(boid)
+                self.chunk(key).boids.append(boid)
+                self.owner[boid] = key
+
+    def boids_near(self, position, radius):     # candidates only, callers still check the distance
+        return [boid for key in self.keys_near(position, radius) if key in self.chunks for boid in self.chunks[key].boids]
+
+    def add_poi(self, poi):
+        key = self.key(poi.position.x, poi.position.y)
+        self.chunk(key).POIs.append(poi)
+        self.owner[poi] = key
+
+    def remove_poi(self, poi):
+        self.chunks[self.owner.pop(poi)].POIs.remove(poi)
+
+    def pois_near(self, position, radius):
+        return [poi for key in self.keys_near(position, radius) if key in self.chunks for poi in self.chunks[key].POIs]
+
+    def group(self, boids, POIs):               # {key: (boid rows, POI rows)} of (x, y, ...) tuples, as in Snapshot.chunks
+        chunks = {}
+        for n, points in enumerate((boids, POIs)):
+            for row, point in enumerate(points):
+                chunks.setdefault(self.key(point[0], point[1]), ([], []))[n].append(row)
+        return chunks
+
+
+class Camera:
+    # World point p shows at (p - origin) * zoom on screen
+    def __init__(self, screen_size, zoom=1.0, min_zoom=0.05, max_zoom=8.0):
+        self.screen_size = screen_size
+        self.x, self.y = 0.0, 0.0           # world point at the top-left of the window
+        self.zoom = zoom
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
+    def to_screen(self, x, y):
+        return (x - self.x) * self.zoom, (y - self.y) * self.zoom
+
+    def to_world(self, sx, sy):
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def view(self):                         # visible world rectangle (x0, y0, x1, y1)
+        return self.x, self.y, self.x + self.screen_size[0] / self.zoom, self.y + self.screen_size[1] / self.zoom
+
+    def pan(self, dx, dy):                  # by screen pixels
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+
+    def zoom_at(self, factor, sx, sy):      # keep the world point under (sx, sy) in place
+        wx, wy = self.to_world(sx, sy)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.x, self.y = wx - sx / self.zoom, wy - sy / self.zoom
+
+    def handle(self, event, pan_step=200):
+        # mouse wheel zooms at the pointer, arrow keys / WASD pan by pan_step screen pixels
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom_at(1.1 ** event.y, *pygame.mouse.get_pos())
+        elif event.type == pygame.KEYDOWN:
+            step = {pygame.K_LEFT: (-1, 0), pygame.K_a: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_d: (1, 0),
+                    pygame.K_UP: (0, -1), pygame.K_w: (0, -1), pygame.K_DOWN: (0, 1), pygame.K_s: (0, 1)}.get(event.key)
+            if step is not None:
+                self.pan(step[0] * pan_step, step[1] * pan_step)
+